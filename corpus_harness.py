@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import BaseModel
+from zpdf import ZPDF
+from zpdf_store import ZPDFCache
+from zpdf_ingest import ingest
+
+
+class ItemFailure(BaseModel):
+    file_path: str
+    toc_key: str
+    reason: str  # not_found, bounds, text or error
+
+
+class DocumentReport(BaseModel):
+    file_path: str
+    items_count: int
+    passed_count: int
+    failures: list[ItemFailure] = []
+    coverage_metric: float | None = None
+    page_count: int = 0
+    parse_seconds: float = 0.0
+    ingest_seconds: float = 0.0
+    extraction_seconds: float = 0.0
+    extracted_chars: int = 0
+    error: str | None = None
+
+
+class CorpusReport(BaseModel):
+    documents: list[DocumentReport]
+    items_count: int
+    passed_count: int
+    failed_count: int
+    accuracy: float
+    failure_counts: dict[str, int]
+    mean_coverage_metric: float | None
+    parse_pages_per_second: float | None
+    extraction_chars_per_second: float | None
+    elapsed: float = 0.0
+
+    @property
+    def failures(self) -> list[ItemFailure]:
+        return [failure for document in self.documents for failure in document.failures]
+
+    @classmethod
+    def from_documents(cls, documents: list[DocumentReport], elapsed: float = 0.0) -> 'CorpusReport':
+        items_count = sum(document.items_count for document in documents)
+        passed_count = sum(document.passed_count for document in documents)
+        failure_counts = {}
+        for document in documents:
+            for failure in document.failures:
+                failure_counts[failure.reason] = failure_counts.get(failure.reason, 0) + 1
+        coverage_metrics = [document.coverage_metric for document in documents if document.coverage_metric is not None]
+        parse_seconds = sum(document.parse_seconds for document in documents)
+        extraction_seconds = sum(document.extraction_seconds for document in documents)
+        return cls(
+            documents=documents,
+            items_count=items_count,
+            passed_count=passed_count,
+            failed_count=items_count - passed_count,
+            accuracy=passed_count / items_count if items_count else 1.0,
+            failure_counts=failure_counts,
+            mean_coverage_metric=sum(coverage_metrics) / len(coverage_metrics) if coverage_metrics else None,
+            parse_pages_per_second=sum(document.page_count for document in documents) / parse_seconds if parse_seconds else None,
+            extraction_chars_per_second=sum(document.extracted_chars for document in documents) / extraction_seconds if extraction_seconds else None,
+            elapsed=elapsed,
+        )
+
+
+def load_testbench(testbench_path: str) -> dict[str, list[dict]]:
+    ''' Testbench items grouped per file path '''
+    with open(testbench_path, 'r') as f:
+        testbench = json.loads(f.read())
+    testbench_items = {}
+    for item in testbench:
+        testbench_items.setdefault(item['file_path'], []).append(item)
+    return testbench_items
+
+
+def evaluate_zpdf(zpdf: ZPDF, items: list[dict]) -> DocumentReport:
+    ''' Bounds of every item in one bulk lookup, then the text of the items with expected text in one page ordered batch '''
+    file_path = items[0]['file_path'] if items else zpdf.file_path
+    nodes = zpdf.find_toc_tree_nodes([item['toc_key'] for item in items])
+    failures = []
+    text_items = []
+    for item, node in zip(items, nodes):
+        if not node:
+            failures.append(ItemFailure(file_path=file_path, toc_key=item['toc_key'], reason='not_found'))
+        elif node.start_page != item['start_page'] or node.end_page != item['end_page'] or node.end_tag != item['end_tag']:
+            failures.append(ItemFailure(file_path=file_path, toc_key=item['toc_key'], reason='bounds'))
+        elif item['text_file_path']:
+            text_items.append(item)
+
+    start_time = time.perf_counter()
+    node_texts = zpdf.get_toc_nodes_text([item['toc_key'] for item in text_items])
+    extraction_seconds = time.perf_counter() - start_time
+
+    # expected text files shared by several items are read once
+    expected_texts = {}
+    for item, node_text in zip(text_items, node_texts):
+        text_file_path = item['text_file_path']
+        if text_file_path not in expected_texts:
+            with open(text_file_path, 'r') as f:
+                expected_texts[text_file_path] = f.read()
+        if node_text != expected_texts[text_file_path]:
+            failures.append(ItemFailure(file_path=file_path, toc_key=item['toc_key'], reason='text'))
+
+    return DocumentReport(
+        file_path=file_path,
+        items_count=len(items),
+        passed_count=len(items) - len(failures),
+        failures=failures,
+        coverage_metric=zpdf.coverage_metric,
+        page_count=zpdf.page_count,
+        extraction_seconds=extraction_seconds,
+        extracted_chars=sum(len(node_text) for node_text in node_texts if node_text),
+    )
+
+
+def evaluate_document(file_path: str, items: list[dict], cache_dir: str) -> DocumentReport:
+    ''' Pool task, the TOC tree and page text come from the cache store filled by ingest '''
+    try:
+        with ZPDF.open(file_path, store=ZPDFCache(cache_dir), sink=None) as zpdf:
+            return evaluate_zpdf(zpdf, items)
+    except Exception:
+        return DocumentReport(
+            file_path=file_path,
+            items_count=len(items),
+            passed_count=0,
+            failures=[ItemFailure(file_path=file_path, toc_key=item['toc_key'], reason='error') for item in items],
+            error=traceback.format_exc(),
+        )
+
+
+def run_harness(
+    testbench_path: str = 'data/testbench.json',
+    cache_dir: str = 'cache/store',
+    workers: int | None = None,
+    timeout: float | None = None,
+    refresh: bool = False,
+    text_store: bool = True,
+) -> CorpusReport:
+    ''' Parse the testbench documents in parallel (cached trees are reused unless refresh), then evaluate them in parallel
+
+    parse_seconds is the parse time recorded with the cached tree, ingest_seconds the wall time of this run
+    '''
+    start_time = time.perf_counter()
+    testbench_items = load_testbench(testbench_path)
+    ingest_results = {result.file_path: result for result in ingest(list(testbench_items), workers, timeout, cache_dir=cache_dir, refresh=refresh, text_store=text_store)}
+    documents = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            file_path: executor.submit(evaluate_document, file_path, items, cache_dir)
+            for file_path, items in testbench_items.items() if ingest_results[file_path].success
+        }
+        for file_path, items in sorted(testbench_items.items()):
+            ingest_result = ingest_results[file_path]
+            if not ingest_result.success:
+                documents.append(DocumentReport(
+                    file_path=file_path,
+                    items_count=len(items),
+                    passed_count=0,
+                    failures=[ItemFailure(file_path=file_path, toc_key=item['toc_key'], reason='error') for item in items],
+                    ingest_seconds=ingest_result.elapsed,
+                    error=ingest_result.error,
+                ))
+                continue
+            document = futures[file_path].result()
+            document.parse_seconds = ingest_result.benchmark['timings'].get('parse_total', 0.0)
+            document.ingest_seconds = ingest_result.elapsed
+            documents.append(document)
+    return CorpusReport.from_documents(documents, time.perf_counter() - start_time)
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float = 0.2, min_delta: float = 0.01) -> list[dict]:
+    ''' Documents that lost passing items or coverage, or got slower than the baseline by more than threshold, deltas under min_delta seconds are noise '''
+    baseline_documents = {document['file_path']: document for document in baseline['documents']}
+    regressions = []
+    for document in current['documents']:
+        baseline_document = baseline_documents.get(document['file_path'])
+        if not baseline_document:
+            continue
+        for metric in ('passed_count', 'coverage_metric'):
+            if document[metric] is not None and baseline_document[metric] is not None and document[metric] < baseline_document[metric]:
+                regressions.append({'file_path': document['file_path'], 'metric': metric, 'baseline': baseline_document[metric], 'current': document[metric]})
+        for metric in ('parse_seconds', 'extraction_seconds'):
+            elapsed, baseline_elapsed = document[metric], baseline_document[metric]
+            if elapsed > baseline_elapsed * (1 + threshold) and elapsed - baseline_elapsed > min_delta:
+                regressions.append({'file_path': document['file_path'], 'metric': metric, 'baseline': baseline_elapsed, 'current': elapsed})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Testbench accuracy and throughput over a corpus of PDFs')
+    parser.add_argument('testbench', nargs='?', default='data/testbench.json', help='testbench items with expected bounds and text')
+    parser.add_argument('--cache-dir', default='cache/store', help='ZPDFCache store directory, cached trees and page text are reused')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, defaults to the cpu count')
+    parser.add_argument('--timeout', type=float, default=None, help='per file parse timeout in seconds')
+    parser.add_argument('--refresh', action='store_true', help='reparse files that already have a valid cache')
+    parser.add_argument('--no-text-store', action='store_true', help='extract text from the PDFs instead of the page text store')
+    # reports stay out of cache/, whose json files are all read as TOC caches and wiped by benchmark.py
+    parser.add_argument('--output', default='bench/corpus_report.json')
+    parser.add_argument('--min-accuracy', type=float, default=1.0, help='exit with 1 below this share of passing items')
+    parser.add_argument('--compare', help='baseline report JSON, exit with 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--min-delta', type=float, default=0.01, help='ignored slowdowns in seconds')
+    args = parser.parse_args()
+
+    report = run_harness(args.testbench, args.cache_dir, args.workers, args.timeout, args.refresh, not args.no_text_store)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        f.write(report.model_dump_json(indent=2))
+    for failure in report.failures:
+        print('FAILED:', failure.file_path, '-', failure.toc_key, failure.reason, file=sys.stderr)
+    print(json.dumps(report.model_dump(exclude={'documents'}), indent=2))
+
+    failed = report.accuracy < args.min_accuracy
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.loads(f.read())
+        regressions = compare_reports(baseline, report.model_dump(), args.threshold, args.min_delta)
+        for regression in regressions:
+            print('Regression:', regression['file_path'], regression['metric'], regression['baseline'], '->', regression['current'])
+        print('Regressions:', len(regressions))
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
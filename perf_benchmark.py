@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import fitz
+import argparse
+import tempfile
+import platform
+import tracemalloc
+import multiprocessing
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+from zpdf import ZPDF, CompactTocTree, PARSER_VERSION
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+MEMORY_METRICS = ['peak_rss_bytes', 'python_heap_peak_bytes']
+PHASES = ['open', 'link_extraction', 'tree_build', 'validation', 'post_correction', 'parse_total', 'cache_dump', 'cache_load', 'text_extraction']
+
+
+def load_testbench_keys(testbench_path: str | None) -> dict[str, list[str]]:
+    ''' TOC keys to extract per file path '''
+    if not testbench_path or not os.path.exists(testbench_path):
+        return {}
+    with open(testbench_path, 'r') as f:
+        testbench = json.loads(f.read())
+    testbench_keys = {}
+    for item in testbench:
+        testbench_keys.setdefault(item['file_path'], []).append(item['toc_key'])
+    return testbench_keys
+
+
+def measure_parse_memory(file_path: str) -> dict:
+    ''' Runs in a fresh process: peak_rss_bytes covers the MuPDF allocations (and the interpreter), python_heap_peak_bytes only the traced python heap '''
+    tracemalloc.start()
+    ZPDF(file_path, sink=None).close()
+    python_heap_peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    peak_rss_bytes = None
+    if resource is not None:
+        # kilobytes on linux, bytes on macos
+        peak_rss_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {'peak_rss_bytes': peak_rss_bytes, 'python_heap_peak_bytes': python_heap_peak_bytes}
+
+
+def benchmark_file(file_path: str, toc_keys: list[str], memory: bool = True) -> dict:
+    ''' Phase timings of a single PDF, memory metrics come from a separate parse in a spawned process so earlier peaks do not leak in '''
+    timings = {}
+    start_time = time.perf_counter()
+    fitz.open(file_path).close()
+    timings['open'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    zpdf = ZPDF(file_path, sink=None)
+    timings['parse_total'] = time.perf_counter() - start_time
+    parse_timings = zpdf.get_benchmark()['timings']
+    timings.update({phase: parse_timings.get(phase, 0.0) for phase in ('link_extraction', 'tree_build', 'validation', 'post_correction')})
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, 'cache.ztoc')
+        start_time = time.perf_counter()
+        zpdf.get_compact_cache().dump(cache_path)
+        timings['cache_dump'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        cached_zpdf = ZPDF(file_path, cache=CompactTocTree.load(cache_path), lazy=True, sink=None)
+        timings['cache_load'] = time.perf_counter() - start_time
+
+    # cold page cache, the PDF is opened on first text access
+    start_time = time.perf_counter()
+    for toc_key in toc_keys:
+        cached_zpdf.get_toc_node_text(cached_zpdf.find_toc_tree_node(toc_key))
+    timings['text_extraction'] = time.perf_counter() - start_time
+    cached_zpdf.close()
+    zpdf.close()
+
+    memory_metrics = dict.fromkeys(MEMORY_METRICS)
+    if memory:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            memory_metrics = executor.submit(measure_parse_memory, file_path).result()
+
+    return {
+        'timings': timings,
+        **memory_metrics,
+        'toc_headers_count': zpdf.toc_headers_count,
+        'counters': zpdf.get_benchmark()['counters'],
+        'text_keys_count': len(toc_keys),
+    }
+
+
+def run_benchmark(file_paths: list[str], testbench_path: str | None = 'data/testbench.json', repeat: int = 1, memory: bool = True) -> dict:
+    ''' Best of repeat runs per phase '''
+    testbench_keys = load_testbench_keys(testbench_path)
+    documents = {}
+    for file_path in sorted(file_paths):
+        runs = []
+        for run_number in range(repeat):
+            runs.append(benchmark_file(file_path, testbench_keys.get(file_path, []), memory=memory and run_number == 0))
+        document = runs[0]
+        document['timings'] = {phase: min(run['timings'][phase] for run in runs) for phase in PHASES}
+        documents[file_path] = document
+        print('Benchmarked:', file_path, f"{document['timings']['parse_total']:.3f}s", file=sys.stderr)
+
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'parser_version': PARSER_VERSION,
+            'repeat': repeat,
+        },
+        'documents': documents,
+        'totals': {phase: sum(document['timings'][phase] for document in documents.values()) for phase in PHASES},
+    }
+
+
+def compare_benchmarks(baseline: dict, current: dict, threshold: float = 0.2, min_delta: float = 0.01) -> list[dict]:
+    ''' Phases (and peak memory) that got slower than the baseline by more than threshold, deltas under min_delta seconds are noise '''
+    regressions = []
+    for file_path, document in current['documents'].items():
+        baseline_document = baseline['documents'].get(file_path)
+        if not baseline_document:
+            continue
+        for phase, elapsed in document['timings'].items():
+            baseline_elapsed = baseline_document['timings'].get(phase)
+            if baseline_elapsed is None:
+                continue
+            if elapsed > baseline_elapsed * (1 + threshold) and elapsed - baseline_elapsed > min_delta:
+                regressions.append({'file_path': file_path, 'metric': phase, 'baseline': baseline_elapsed, 'current': elapsed})
+        for metric in MEMORY_METRICS:
+            baseline_memory, memory = baseline_document.get(metric), document.get(metric)
+            if baseline_memory and memory and memory > baseline_memory * (1 + threshold):
+                regressions.append({'file_path': file_path, 'metric': metric, 'baseline': baseline_memory, 'current': memory})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per phase timing and peak memory benchmark of the PDF parser')
+    parser.add_argument('file_patterns', nargs='*', default=['data/*.pdf'], help='PDF file paths or glob patterns')
+    parser.add_argument('--testbench', default='data/testbench.json', help='TOC keys to extract per file')
+    parser.add_argument('--repeat', type=int, default=1, help='keep the best of N runs per phase')
+    parser.add_argument('--no-memory', action='store_true', help='skip the separate parse process used for peak memory')
+    # reports stay out of cache/, whose json files are all read as TOC caches and wiped by benchmark.py
+    parser.add_argument('--output', default='bench/perf_benchmark.json')
+    parser.add_argument('--compare', help='baseline benchmark JSON, exit with 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--min-delta', type=float, default=0.01, help='ignored slowdowns in seconds')
+    args = parser.parse_args()
+
+    file_paths = sorted({file_path for pattern in args.file_patterns for file_path in glob(pattern)})
+    benchmark = run_benchmark(file_paths, args.testbench, repeat=args.repeat, memory=not args.no_memory)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(benchmark, indent=2))
+    print(json.dumps(benchmark['totals'], indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.loads(f.read())
+        regressions = compare_benchmarks(baseline, benchmark, args.threshold, args.min_delta)
+        for regression in regressions:
+            print('Regression:', regression['file_path'], regression['metric'], regression['baseline'], '->', regression['current'])
+        print('Regressions:', len(regressions))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
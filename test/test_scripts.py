@@ -1,6 +1,23 @@
+import gc
+import sys
 import json
+import time
+import shutil
+import asyncio
+import threading
+import fitz
+import hashlib
 from glob import glob
 from zpdf import *
+from zpdf_store import ZPDFCache
+from zpdf_events import Instrumentation, ListSink
+from zpdf_ingest import ingest
+from zpdf_async import AsyncZPDF
+from zpdf_pool import ZPDFPool
+from zpdf_search import SectionSearchIndex, SearchHit
+from zpdf_retrieval import SectionVectorIndex, TfidfEmbedder
+from perf_benchmark import compare_benchmarks
+from corpus_harness import CorpusReport, DocumentReport, load_testbench, evaluate_zpdf, run_harness, compare_reports
 
 
 RXI_TEST_FILE = 'sample_rxi_12'
@@ -8,49 +25,17 @@ MAC_TEST_FILE = 'sample_mac_1'
 
 
 def _check_testbench(z_pdf_map: dict[str, ZPDF]) -> bool:
-    # load testbench
-    with open('data/testbench.json', 'r') as f:
-        testbench = json.loads(f.read())
-
-    # bounds testbench
-    success_count = 0
-    failed_count = 0
-
-    def success_routine(item):
-        nonlocal success_count
-        print('SUCCESS:', item['file_path'], '-', item['toc_key'])
-        success_count += 1
-
-    def failed_routine(item):
-        nonlocal failed_count
-        print('FAILED:', item['file_path'], '-', item['toc_key'])
-        failed_count += 1
-
-    for idx, item in enumerate(testbench):
-        print(idx, 'Testing:', item['file_path'], '-', item['toc_key'])
-        zpdf = z_pdf_map[item['file_path']]
-        toc_key: str = item['toc_key']
-        toc_tree_node = zpdf.find_toc_tree_node(toc_key)
-        if not toc_tree_node:
-            failed_routine(item)
-            continue
-        if toc_tree_node.start_page != item['start_page'] or toc_tree_node.end_page != item['end_page'] or toc_tree_node.end_tag != item['end_tag']:
-            failed_routine(item)
-            continue
-        if item['text_file_path']:
-            node_text = zpdf.get_toc_node_text(toc_tree_node)
-            with open(item['text_file_path'], 'r') as f:
-                target_node_text = f.read()
-            if node_text != target_node_text:
-                failed_routine(item)
-                continue
-        success_routine(item)
+    # bounds and text of every item, checked in bulk per document
+    testbench_items = load_testbench('data/testbench.json')
+    report = CorpusReport.from_documents([evaluate_zpdf(z_pdf_map[file_path], items) for file_path, items in testbench_items.items()])
+    for failure in report.failures:
+        print('FAILED:', failure.file_path, '-', failure.toc_key, failure.reason)
 
-    print('Total Testbench Items:', len(testbench))
-    print('SUCCESS:', success_count)
-    print('FAILED:', failed_count)
-    assert failed_count == 0
-    assert success_count + failed_count == len(testbench)
+    print('Total Testbench Items:', report.items_count)
+    print('SUCCESS:', report.passed_count)
+    print('FAILED:', report.failed_count)
+    assert report.failed_count == 0
+    assert report.items_count == sum(len(items) for items in testbench_items.values())
 
 
 def _validate_cache_bounds(cache: dict) -> bool:
@@ -113,6 +98,133 @@ def test_caching():
     _check_testbench(z_pdf_map)
 
 
+def test_lazy_caching():
+    with open('data/testbench.json', 'r') as f:
+        testbench = json.loads(f.read())
+
+    for item in testbench:
+        cache_path = f"cache/{item['file_path'].replace('data/', '').replace('.pdf', '')}_cache.json"
+        with open(cache_path, 'r') as f:
+            cache = json.loads(f.read())
+        with ZPDF(file_path=item['file_path'], cache=cache, lazy=True) as zpdf:
+            toc_tree_node = zpdf.find_toc_tree_node(item['toc_key'])
+            assert not zpdf.is_open
+            assert isinstance(toc_tree_node, TocTreeNode)
+            assert toc_tree_node.start_page == item['start_page']
+            assert toc_tree_node.end_page == item['end_page']
+            assert toc_tree_node.end_tag == item['end_tag']
+            assert zpdf.get_cache() == cache
+
+
+def test_compact_cache(tmp_path):
+    for cache_file_path in glob('cache/*.json'):
+        with open(cache_file_path, 'r') as f:
+            cache = json.loads(f.read())
+        zpdf = ZPDF(file_path=cache_file_path, cache=cache, lazy=True)
+        cache_key = hashlib.sha256(cache_file_path.encode()).hexdigest()
+        compact_cache = CompactTocTree.from_toc_tree(zpdf.get_toc_tree(), cache_key=cache_key, meta={'coverage_metric': 1.0})
+        compact_cache.dump(tmp_path / 'cache.ztoc')
+
+        loaded_cache = CompactTocTree.load(tmp_path / 'cache.ztoc', cache_key=cache_key)
+        assert loaded_cache.to_cache() == cache
+        assert loaded_cache.meta == {'coverage_metric': 1.0}
+        assert CompactTocTree.load(tmp_path / 'cache.ztoc', cache_key='0' * 64) is None
+
+        # truncated or padded buffers are invalid, never an exception
+        compact_bytes = compact_cache.to_bytes()
+        for size in (len(compact_bytes) // 2, 60, len(compact_bytes) - 3):
+            assert CompactTocTree.from_bytes(compact_bytes[:size]) is None
+        assert CompactTocTree.from_bytes(compact_bytes + b'\0' * 4) is None
+
+        zpdf = ZPDF(file_path=cache_file_path, cache=loaded_cache, lazy=True)
+        assert not zpdf.is_open
+        assert zpdf.get_cache() == cache
+        assert zpdf.coverage_metric == 1.0
+
+
+def test_cache_store(tmp_path):
+    store = ZPDFCache(str(tmp_path / 'store'))
+    with open(f"cache/{RXI_TEST_FILE}_cache.json", 'r') as f:
+        cache = json.loads(f.read())
+    pdf_path = tmp_path / 'sample.pdf'
+    pdf_path.write_bytes(b'%PDF-1.4 sample')
+
+    cache_key = store.get_cache_key(str(pdf_path))
+    assert store.load(cache_key) is None
+    zpdf = ZPDF(file_path=str(pdf_path), cache=cache, lazy=True)
+    store.save(CompactTocTree.from_toc_tree(zpdf.get_toc_tree(), cache_key=cache_key))
+    assert store.load(cache_key).to_cache() == cache
+    assert store.get_stats()['hits'] == 1
+
+    # modified PDF invalidates its cache entry
+    pdf_path.write_bytes(b'%PDF-1.4 sample revision 2')
+    new_cache_key = store.get_cache_key(str(pdf_path))
+    assert new_cache_key != cache_key
+    assert store.load(cache_key) is None
+    assert store.load(new_cache_key) is None
+
+    # size bounded eviction
+    entry_size = len(CompactTocTree.from_toc_tree(zpdf.get_toc_tree()).to_bytes())
+    store = ZPDFCache(str(tmp_path / 'bounded_store'), max_bytes=entry_size * 2)
+    for idx in range(4):
+        store.save(CompactTocTree.from_toc_tree(zpdf.get_toc_tree(), cache_key=f"{idx:064x}"))
+    assert store.get_stats()['evictions'] == 2
+    assert store.load(f"{0:064x}") is None
+    assert store.load(f"{3:064x}") is not None
+
+
+def test_cache_store_entry_locks(tmp_path):
+    store = ZPDFCache(str(tmp_path / 'store'))
+    for idx in range(64):
+        with store.entry_lock(f"{idx:064x}"):
+            pass
+    assert os.listdir(tmp_path / 'store' / ZPDFCache.LOCK_DIR) == []
+
+    # lock files removed on release still exclude waiters
+    holders = []
+    overlaps = []
+
+    def parse_entry():
+        for _ in range(20):
+            with store.entry_lock(f"{0:064x}"):
+                holders.append(1)
+                time.sleep(0.001)
+                overlaps.append(len(holders) > 1)
+                holders.pop()
+
+    threads = [threading.Thread(target=parse_entry) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(overlaps) == 80 and not any(overlaps)
+    assert os.listdir(tmp_path / 'store' / ZPDFCache.LOCK_DIR) == []
+
+
+def test_open_with_cache_store(tmp_path):
+    store = ZPDFCache(str(tmp_path / 'store'))
+    zpdf = ZPDF.open(f"data/{RXI_TEST_FILE}.pdf", store=store)
+    cached_zpdf = ZPDF.open(f"data/{RXI_TEST_FILE}.pdf", store=store)
+    assert not cached_zpdf.is_open
+    assert cached_zpdf.get_cache() == zpdf.get_cache()
+    assert cached_zpdf.get_benchmark() == zpdf.get_benchmark()
+    # the lazy open and text extraction are reported apart from the cached parse metrics
+    cached_zpdf.extract_text(['8'])
+    assert cached_zpdf.get_benchmark()['timings'] == zpdf.get_benchmark()['timings']
+    assert 'open' in cached_zpdf.get_benchmark()['session_timings'] and cached_zpdf.get_benchmark()['session_counters']['pages_loaded'] > 0
+
+
+def test_ingest(tmp_path):
+    corrupt_file_path = tmp_path / 'corrupt.pdf'
+    corrupt_file_path.write_bytes(b'not a pdf')
+    file_paths = [f"data/{RXI_TEST_FILE}.pdf", f"data/{MAC_TEST_FILE}.pdf", str(corrupt_file_path)]
+    results = {result.file_path: result for result in ingest(file_paths, workers=2, timeout=300, cache_dir=str(tmp_path / 'store'))}
+    assert len(results) == len(file_paths)
+    assert not results[str(corrupt_file_path)].success
+    assert results[f"data/{RXI_TEST_FILE}.pdf"].success
+    assert results[f"data/{MAC_TEST_FILE}.pdf"].benchmark['toc_headers_count'] > 0
+
+
 def test_extract_node_text():
     # load cache
     with open(f"cache/{RXI_TEST_FILE}_cache.json", 'r') as f:
@@ -140,6 +252,120 @@ def test_extract_text_no_overlap():
     assert len(sections) == len(toc_keys)
 
 
+def test_batched_extract_text():
+    zpdf = ZPDF(file_path=f"data/{RXI_TEST_FILE}.pdf", page_cache=PageTextCache(max_pages=0))
+    toc_keys = list(zpdf._toc_index) + ['99.1']
+    filtered_keys = zpdf._filter_key_overlaps(toc_keys)
+    assert filtered_keys == ZPDF._remove_key_overlaps(toc_keys)
+    assert zpdf.extract_text(toc_keys) == [zpdf.get_toc_node_text(zpdf.find_toc_tree_node(key)) for key in filtered_keys]
+
+
+def test_parallel_page_extraction():
+    zpdf = ZPDF(file_path=f"data/{RXI_TEST_FILE}.pdf", page_cache=PageTextCache(max_pages=0))
+    page_pool = create_page_pool(workers=2)
+    pooled_zpdf = ZPDF(file_path=f"data/{RXI_TEST_FILE}.pdf", page_cache=PageTextCache(max_pages=0), page_pool=page_pool, page_pool_workers=2)
+    pooled_zpdf.parallel_min_pages = 1
+    pooled_zpdf.parallel_chunk_pages = 3
+    toc_keys = [node.link_idx for node in zpdf.get_toc_tree()]
+    try:
+        assert pooled_zpdf.extract_text(toc_keys) == zpdf.extract_text(toc_keys)
+        assert pooled_zpdf.get_benchmark()['session_counters']['pages_pooled'] > 0
+        pooled_zpdf.parallel_max_chunks = 1
+        assert pooled_zpdf.extract_text(toc_keys) == zpdf.extract_text(toc_keys)
+    finally:
+        page_pool.shutdown()
+
+
+def test_stream_ingestion(tmp_path):
+    file_path = f"data/{RXI_TEST_FILE}.pdf"
+    zpdf = ZPDF(file_path=file_path)
+    with open(file_path, 'rb') as f:
+        pdf_bytes = f.read()
+    assert compute_stream_cache_key(pdf_bytes) == compute_stream_cache_key(memoryview(pdf_bytes)) == compute_cache_key(file_path)
+
+    stream_zpdf = ZPDF.from_stream(memoryview(pdf_bytes), name=file_path, lazy=False)
+    mmap_zpdf = ZPDF.from_mmap(file_path, lazy=False)
+    for other_zpdf in (stream_zpdf, mmap_zpdf):
+        assert other_zpdf.get_cache() == zpdf.get_cache()
+        assert other_zpdf.get_cache_key() == zpdf.get_cache_key()
+        assert other_zpdf.extract_text(['8']) == zpdf.extract_text(['8'])
+    assert stream_zpdf.source_path is None and mmap_zpdf.source_path == file_path
+
+    # a stored stream loads without parsing
+    store = ZPDFCache(str(tmp_path))
+    ZPDF.from_stream(pdf_bytes, store=store)
+    cached_zpdf = ZPDF.from_stream(pdf_bytes, store=store)
+    assert not cached_zpdf.is_open
+    assert cached_zpdf.get_cache() == zpdf.get_cache()
+
+
+def test_page_text_store(tmp_path):
+    file_path = f"data/{RXI_TEST_FILE}.pdf"
+    zpdf = ZPDF(file_path=file_path)
+    text_store = zpdf.get_text_store()
+    assert text_store.page_count == zpdf.doc.page_count
+    assert text_store.get_page_text(3) == zpdf.doc.load_page(3).get_text()
+
+    store = ZPDFCache(str(tmp_path))
+    store.save(zpdf.get_compact_cache())
+    store.save_text(text_store)
+    replica = ZPDF.from_store(zpdf.get_cache_key(), store)
+    toc_keys = ['8', '1.5.2', '14']
+    assert replica.extract_text(toc_keys) == zpdf.extract_text(toc_keys)
+    assert not replica.is_open
+    assert ZPDF.from_store('0' * 64, store) is None
+
+    # stale or foreign files are rejected
+    assert PageTextStore.from_bytes(text_store.to_bytes(), cache_key='0' * 64) is None
+    assert PageTextStore.from_bytes(zpdf.get_compact_cache().to_bytes()) is None
+    text_store_bytes = text_store.to_bytes()
+    assert PageTextStore.from_bytes(text_store_bytes[:-1]) is None
+    assert PageTextStore.from_bytes(text_store_bytes[:40]) is None
+
+
+def test_find_toc_tree_nodes():
+    # load cache
+    with open(f"cache/{RXI_TEST_FILE}_cache.json", 'r') as f:
+        cache = json.loads(f.read())
+    zpdf = ZPDF(file_path=f"data/{RXI_TEST_FILE}.pdf", cache=cache)
+
+    toc_keys = ['8', '8.3.6', '4.4.1', '99.1']
+    nodes = zpdf.find_toc_tree_nodes(toc_keys)
+    assert [node.link_idx if node else None for node in nodes] == ['8', '8.3.6', '4.4.1', None]
+    assert zpdf.find_toc_parent_node('8.3.6').link_idx == '8.3'
+    assert zpdf.find_toc_parent_node('8') is None
+    prev_node, next_node = zpdf.find_toc_sibling_nodes('8')
+    assert prev_node.link_idx == '7' and next_node.link_idx == '9'
+
+
+def test_page_text_cache_lru():
+    page_cache = PageTextCache(max_pages=2)
+    page_cache.put(1, 'page 1')
+    page_cache.put(2, 'page 2')
+    assert page_cache.get(1) == 'page 1'
+    page_cache.put(3, 'page 3')  # evicts page 2, least recently used
+    assert page_cache.get(2) is None
+    assert page_cache.get(3) == 'page 3'
+    assert page_cache.get_stats()['evictions'] == 1
+    assert page_cache.hits == 2 and page_cache.misses == 1
+
+    # byte budget
+    page_cache = PageTextCache(max_pages=100, max_bytes=sys.getsizeof('x' * 100) * 2)
+    for page_number in range(5):
+        page_cache.put(page_number, 'x' * 100)
+    assert page_cache.get_stats()['pages'] == 2
+
+
+def test_extract_text_page_cache():
+    with open(f"cache/{RXI_TEST_FILE}_cache.json", 'r') as f:
+        cache = json.loads(f.read())
+    zpdf = ZPDF(file_path=f"data/{RXI_TEST_FILE}.pdf", cache=cache)
+    first_sections = zpdf.extract_text(['8'])
+    misses = zpdf.get_page_cache_stats()['misses']
+    assert zpdf.extract_text(['8']) == first_sections
+    assert zpdf.get_page_cache_stats()['misses'] == misses
+
+
 def test_overlaps_filter():
     test_set = [
         (['8.1.7', '8.2.3', '8', '8.4'], ['8']),
@@ -147,6 +373,7 @@ def test_overlaps_filter():
         (['1.1.3', '1.1', '1.5.2', '1.5', '1.1.5', '2'], ['1.1', '1.5', '2']),
         (['1.1.3', '1.1', '1.5.2', '1.5', '1.1.5', '2', '7.4.1', '7.4'], ['1.1', '1.5', '2', '7.4']),
         (['1.1.3', '1.1', '1.5.2', '1.5', '1.1.5', '2', '7.4.1', '7.4', '7.3.2.2'], ['1.1', '1.5', '2', '7.3.2.2', '7.4']),
+        (['10.2', '1', '10', '1.2', '1'], ['1', '10']),
     ]
     for test_sample in test_set:
         inp, target_out = test_sample
@@ -164,7 +391,64 @@ def test_link_pattern_match():
     ]
 
     for inp, target_out in test_set:
-        assert ZPDF._link_pattern_match(inp) == target_out
+        assert LinkClassifier().match(inp) == target_out
+
+
+def test_link_classifier():
+    link_classifier = LinkClassifier()
+    assert link_classifier.normalize('8.18 GALLEYS - B737/800 FWD AND AFT GALLEY ....... 832') == '8.18 GALLEYS  B737800 FWD AND AFT GALLEY ....... 832'
+    assert link_classifier.normalize('see 8.18') == '\x00'  # short link
+    assert link_classifier.match('33.3.3 ') is None
+    assert link_classifier.match('1. GENERAL') == ('1. GENERAL', '1')
+    family_classifier = LinkClassifier(allowed_header_chars=DEFAULT_ALLOWED_HEADER_CHARS + '-', short_link_threshold=5)
+    assert family_classifier.normalize('see 8.18 - A/B') == 'see 8.18 - AB'
+
+
+def test_detect_toc_region():
+    test_set = [
+        # front matter toc with short first and last pages
+        ([0, 2, 30, 30, 30, 4, 0, 1, 0, 3, 1, 1], 5, [1, 2, 3, 4, 5]),
+        # chapter level tocs
+        ([0, 20, 0, 1, 1, 0, 18, 2, 0, 1], 5, [1, 6, 7]),
+        # body cross references are not link dense compared to toc pages
+        ([0, 25, 25, 6, 6, 6, 6, 6], 5, [1, 2, 3]),
+        # no toc region
+        ([0, 1, 2, 1, 0], 5, []),
+        ([], 5, []),
+    ]
+
+    for forward_link_counts, min_links, target_out in test_set:
+        assert ZPDF._detect_toc_region(forward_link_counts, min_links) == target_out
+
+
+def test_build_toc_tree():
+    link_idx_list = ['0.1', '1', '1.1', '1.1.1', '1.1.2', '1.3.1.1', '1.2', '2', '2.1.1', '2.2', '2.2.1']
+    links = [TocLink(link_idx=link_idx, link_label=f"{link_idx} HEADER", target_page=page) for page, link_idx in enumerate(link_idx_list)]
+    zpdf = ZPDF.__new__(ZPDF)
+    zpdf._fill_next_link_page(links)
+    toc_tree = zpdf._build_toc_tree(links)
+
+    def simplify(nodes: list[TocTreeNode]) -> list:
+        return [(node.link_idx, node.start_page, node.end_page, node.end_tag, simplify(node.children)) for node in nodes]
+
+    # links that skip a level are dropped, parents end where their last child ends
+    assert simplify(toc_tree) == [
+        ('1', 1, 7, '2', [
+            ('1.1', 2, 6, '1.2', [
+                ('1.1.1', 3, 4, '1.1.2', []),
+                ('1.1.2', 4, 6, '1.2', [('1.3.1.1', 5, 6, '1.2', [])]),
+            ]),
+            ('1.2', 6, 7, '2', []),
+        ]),
+        ('2', 7, -1, None, [
+            ('2.2', 9, -1, None, [('2.2.1', 10, -1, None, [])]),
+        ]),
+    ]
+
+    # deep trees do not hit the recursion limit
+    links = [TocLink(link_idx='.'.join(['1'] * (level + 1)), link_label='HEADER', target_page=level) for level in range(5000)]
+    zpdf._fill_next_link_page(links)
+    assert len(zpdf._build_toc_tree(links)) == 1
 
 
 def test_links_gap_check_by_idx():
@@ -214,6 +498,281 @@ def test_terminal_text_extraction():
     assert sections[0] == target_text
 
 
+def test_streaming_text_extraction():
+    with open(f"cache/{RXI_TEST_FILE}_cache.json", 'r') as f:
+        cache = json.loads(f.read())
+    zpdf = ZPDF(file_path=f"data/{RXI_TEST_FILE}.pdf", cache=cache)
+    for toc_key in ['8', '14', '8.3.6', '4.4.1']:
+        toc_tree_node = zpdf.find_toc_tree_node(toc_key)
+        assert ''.join(zpdf.iter_toc_node_text(toc_tree_node)) == zpdf.get_toc_node_text(toc_tree_node)
+
+    toc_keys = ['8.1.7', '8.2.3', '8', '8.4', '14']
+    streamed_sections = [''.join(chunks) for _, chunks in zpdf.iter_extract_text(toc_keys)]
+    assert streamed_sections == zpdf.extract_text(toc_keys)
+
+
+def test_async_text_extraction():
+    with open(f"cache/{RXI_TEST_FILE}_cache.json", 'r') as f:
+        cache = json.loads(f.read())
+
+    async def extract_concurrently() -> list[list[str]]:
+        async_zpdf = await AsyncZPDF.create(f"data/{RXI_TEST_FILE}.pdf", cache=cache)
+        assert async_zpdf.find_toc_tree_node('8').link_idx == '8'
+        sections = await asyncio.gather(*[async_zpdf.extract_text(['8', '12', '14']) for _ in range(8)])
+        await async_zpdf.close()
+        return sections
+
+    sections = asyncio.run(extract_concurrently())
+    zpdf = ZPDF(file_path=f"data/{RXI_TEST_FILE}.pdf", cache=cache)
+    assert all(x == zpdf.extract_text(['8', '12', '14']) for x in sections)
+
+
+def test_document_pool():
+    pool = ZPDFPool(max_open=1)
+    for file_name in [RXI_TEST_FILE, MAC_TEST_FILE]:
+        with open(f"cache/{file_name}_cache.json", 'r') as f:
+            pool.register(file_name, f"data/{file_name}.pdf", cache=json.loads(f.read()))
+
+    rxi_sections = pool.get(RXI_TEST_FILE).extract_text(['8'])
+    pool.get(MAC_TEST_FILE).extract_text(['1'])
+    assert not pool.get(RXI_TEST_FILE).is_open  # evicted, reopened on text access
+    assert pool.get(RXI_TEST_FILE).extract_text(['8']) == rxi_sections
+
+    stats = pool.get_stats()
+    assert stats['open'] == 1
+    assert stats['evictions'] == 2
+    assert stats['reopens'] == 1
+    pool.close()
+
+
+def test_document_pool_leases():
+    pool = ZPDFPool(max_open=1)
+    for file_name in [RXI_TEST_FILE, MAC_TEST_FILE]:
+        with open(f"cache/{file_name}_cache.json", 'r') as f:
+            pool.register(file_name, f"data/{file_name}.pdf", cache=json.loads(f.read()))
+    toc_keys = {RXI_TEST_FILE: ['8', '14'], MAC_TEST_FILE: ['1']}
+    with pool.lease(RXI_TEST_FILE) as zpdf:
+        expected = {RXI_TEST_FILE: zpdf.extract_text(toc_keys[RXI_TEST_FILE])}
+    with pool.lease(MAC_TEST_FILE) as zpdf:
+        expected[MAC_TEST_FILE] = zpdf.extract_text(toc_keys[MAC_TEST_FILE])
+
+    # leased documents are not closed by the evictions of other threads
+    errors = []
+
+    def read_documents(thread_number: int):
+        for i in range(20):
+            file_name = [RXI_TEST_FILE, MAC_TEST_FILE][(thread_number + i) % 2]
+            try:
+                with pool.lease(file_name) as zpdf:
+                    assert zpdf.extract_text(toc_keys[file_name]) == expected[file_name]
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=read_documents, args=(thread_number,)) for thread_number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert pool.get_stats()['open'] <= 1  # budget enforced again once the leases end
+    pool.close()
+
+
+def test_find_text_offsets():
+    node = TocTreeNode(link_idx='8.1', link_label='8.1 GENERAL', start_page=3, end_page=3, end_tag='8.2')
+    flat_page_text = 'HEADER 831 NOISE 8.1 GENERAL body text 8.2 ALSO 8.2 NEXT 8.2 '
+    start_char, end_char = ZPDF._find_single_page_offsets(node, flat_page_text)
+    assert flat_page_text[start_char:end_char] == 'GENERAL body text 8.2 ALSO 8.2 NEXT'
+    assert ZPDF._find_single_page_offsets(node, 'no markers here') == (-1, -1)
+
+    node = TocTreeNode(link_idx='8.1', link_label='8.1 GENERAL', start_page=3, end_page=5, end_tag='8.2')
+    assert flat_page_text[ZPDF._find_start_char(node, flat_page_text):] == 'GENERAL body text 8.2 ALSO 8.2 NEXT 8.2 '
+    assert flat_page_text[:ZPDF._find_end_char(node, flat_page_text)] == 'HEADER 831 NOISE 8.1 GENERAL body text'
+    assert ZPDF._find_end_char(node, 'no markers') == len('no markers')
+
+
+def test_text_offsets_extraction():
+    with open('data/testbench.json', 'r') as f:
+        testbench = json.loads(f.read())
+    items = [item for item in testbench if item['text_file_path']]
+    for file_path in set(item['file_path'] for item in items):
+        zpdf = ZPDF(file_path=file_path, text_offsets=True)
+        indexed_zpdf = ZPDF(file_path=file_path, cache=zpdf.get_cache(), lazy=True)
+        for item in [item for item in items if item['file_path'] == file_path]:
+            toc_tree_node = indexed_zpdf.find_toc_tree_node(item['toc_key'])
+            assert toc_tree_node.start_char is not None
+            with open(item['text_file_path'], 'r') as f:
+                assert indexed_zpdf.get_toc_node_text(toc_tree_node) == f.read()
+
+
+def test_toc_node_models():
+    cache = [{'link_idx': '1', 'link_label': '1 SYSTEMS', 'start_page': 0, 'end_page': 1, 'end_tag': '2', 'children': [
+        {'link_idx': '1.1', 'link_label': '1.1 PUMP', 'start_page': 0, 'end_page': 1, 'end_tag': '2', 'children': []},
+    ]}, {'link_idx': '2', 'link_label': '2 FUEL', 'start_page': 1, 'end_page': -1, 'children': []}]
+    zpdf = ZPDF(file_path='data/missing.pdf', cache=cache, lazy=True, sink=None)
+    zpdf.page_cache.put(0, '1 SYSTEMS\n1.1 PUMP\nText\n')
+    zpdf.page_cache.put(1, 'More\n2 FUEL\n')
+    # models are shared with the parent model while they are referenced
+    node = zpdf.find_toc_tree_node('1')
+    assert zpdf.find_toc_tree_node('1') is node
+    assert zpdf.find_toc_tree_nodes(['1.1'])[0] is node.children[0]
+    assert zpdf.toc_tree[0] is node and [child.link_idx for child in node.children] == ['1.1']
+    # models are not kept alive by the tree once callers drop them
+    del node
+    gc.collect()
+    assert zpdf._toc_index['1']._model() is None and zpdf._toc_index['1.1']._model() is None
+    node = zpdf.find_toc_tree_node('1')
+    # new text offsets are visible in later lookups
+    zpdf.index_text_offsets()
+    indexed_node = zpdf.find_toc_tree_node('1')
+    assert indexed_node is not node and indexed_node.start_char == 0 and indexed_node.children[0].start_char is not None
+    assert not zpdf.is_open
+
+
+def test_untitled_header_lookup():
+    links = [TocLink(link_idx=idx, link_label=f"{idx} LABEL", target_page=page) for idx, page in [('1.1', 3), ('10.1', 5), ('2.1', 7), ('1.2', 8)]]
+    assert ZPDF._get_first_links_by_parent_keys({'1', '2', '3'}, links) == {'1': 0, '2': 2}
+    zpdf = ZPDF.__new__(ZPDF)
+    zpdf.allowed_header_chars = DEFAULT_ALLOWED_HEADER_CHARS
+    zpdf.untitled_labels_count = 0
+    zpdf.instrumentation = Instrumentation(ListSink())
+    zpdf.page_cache = PageTextCache()
+    zpdf.page_cache.put(0, 'CHAPTER 2 SYSTEMS\n1.\nGENERAL ...... 3\n2\n')
+    zpdf.page_cache.put(1, '1\nOTHER PAGE\nCHAPTER 3 FUEL\n')
+    zpdf.toc_pages = {0, 1}
+    header_lookup = zpdf._build_toc_header_lookup()
+    # basic search beats advanced search on the same page, earlier pages beat later ones
+    assert zpdf._try_find_untitled_header('1', header_lookup) == '1.GENERAL '
+    assert zpdf._try_find_untitled_header('2', header_lookup) == '2'
+    assert zpdf._try_find_untitled_header('3', header_lookup) == 'CHAPTER 3 FUEL'
+    assert zpdf._try_find_untitled_header('4', header_lookup) == '4 UNTITLED' and zpdf.untitled_labels_count == 1
+    assert zpdf.instrumentation.sink.events == [('untitled_header', {'link_idx': '4'})]
+
+
+def test_instrumentation():
+    file_path = f"data/{MAC_TEST_FILE}.pdf"
+    sink = ListSink()
+    zpdf = ZPDF(file_path=file_path, sink=sink)
+    events = [event for event, _ in sink.events]
+    assert events[0] == 'init' and 'coverage_metric' in events
+    benchmark = zpdf.get_benchmark()
+    assert set(benchmark['timings']) >= {'open', 'link_extraction', 'tree_build', 'validation', 'parse_total'}
+    assert benchmark['counters']['links_scanned'] >= benchmark['toc_headers_count']
+    silent_zpdf = ZPDF(file_path=file_path, sink=None)
+    assert silent_zpdf.get_cache() == zpdf.get_cache()
+
+
+def test_incremental_update(tmp_path):
+    file_path = 'data/sample_mac_6.pdf'
+    zpdf = ZPDF(file_path=file_path)
+    doc = fitz.open(file_path)
+    doc[doc.page_count - 1].insert_text((72, 72), 'REVISION HIGHLIGHTS', fontsize=9)
+    doc.save(tmp_path / 'revision.pdf')
+    diff = zpdf.update(str(tmp_path / 'revision.pdf'))
+    assert diff.added == [] and diff.removed == [] and diff.modified
+    diff_modified = diff.modified
+    assert diff.reused_toc_pages == diff.scanned_toc_pages
+    assert zpdf.get_cache() == ZPDF(file_path=str(tmp_path / 'revision.pdf')).get_cache()
+    diff = zpdf.update(file_path, compare_text=False)
+    assert diff.modified == []
+
+    # page hashes of a lazily loaded revision come from its compact cache, not from the file overwritten in place
+    store = ZPDFCache(str(tmp_path / 'store'))
+    shutil.copy(file_path, tmp_path / 'current.pdf')
+    ZPDF.open(str(tmp_path / 'current.pdf'), store=store).close()
+    cached_zpdf = ZPDF.open(str(tmp_path / 'current.pdf'), store=store)
+    shutil.copy(tmp_path / 'revision.pdf', tmp_path / 'current.pdf')
+    assert cached_zpdf.update(str(tmp_path / 'current.pdf')).modified == diff_modified
+
+
+def test_compare_benchmarks():
+    baseline = {'documents': {'a.pdf': {'timings': {'parse_total': 1.0, 'open': 0.001}, 'peak_rss_bytes': 10000, 'python_heap_peak_bytes': 1000}}}
+    current = {'documents': {
+        'a.pdf': {'timings': {'parse_total': 1.5, 'open': 0.004}, 'peak_rss_bytes': 13000, 'python_heap_peak_bytes': 1000},
+        'b.pdf': {'timings': {'parse_total': 9.0}, 'peak_rss_bytes': None, 'python_heap_peak_bytes': None},
+    }}
+    regressions = compare_benchmarks(baseline, current, threshold=0.2, min_delta=0.01)
+    assert [(regression['file_path'], regression['metric']) for regression in regressions] == [('a.pdf', 'parse_total'), ('a.pdf', 'peak_rss_bytes')]
+    assert len(compare_benchmarks(baseline, current, threshold=0.05, min_delta=0)) == 3
+
+
+def test_corpus_harness(tmp_path):
+    report = run_harness('data/testbench.json', cache_dir=str(tmp_path), workers=2)
+    assert report.failures == [] and report.accuracy == 1.0
+    assert report.items_count == sum(len(items) for items in load_testbench('data/testbench.json').values())
+    assert all(document.page_count and document.parse_seconds for document in report.documents)
+
+    # second run loads the cached trees and page text
+    cached_report = run_harness('data/testbench.json', cache_dir=str(tmp_path), workers=2)
+    assert cached_report.accuracy == 1.0
+    assert compare_reports(report.model_dump(), cached_report.model_dump(), min_delta=1.0) == []
+
+
+def test_compare_reports():
+    baseline = CorpusReport.from_documents([
+        DocumentReport(file_path='a.pdf', items_count=4, passed_count=4, coverage_metric=1.0, page_count=100, parse_seconds=1.0, extraction_seconds=0.1, extracted_chars=1000),
+        DocumentReport(file_path='b.pdf', items_count=2, passed_count=2, coverage_metric=1.0, page_count=100, parse_seconds=1.0),
+    ])
+    assert baseline.accuracy == 1.0 and baseline.parse_pages_per_second == 100 and baseline.extraction_chars_per_second == 10000
+    current = CorpusReport.from_documents([
+        DocumentReport(file_path='a.pdf', items_count=4, passed_count=3, coverage_metric=1.0, page_count=100, parse_seconds=1.5, extraction_seconds=0.105),
+        DocumentReport(file_path='c.pdf', items_count=1, passed_count=0, error='worker exited with code -9'),
+    ])
+    assert current.accuracy == 0.6 and current.mean_coverage_metric == 1.0
+    regressions = compare_reports(baseline.model_dump(), current.model_dump(), threshold=0.2, min_delta=0.01)
+    assert [(regression['file_path'], regression['metric']) for regression in regressions] == [('a.pdf', 'passed_count'), ('a.pdf', 'parse_seconds')]
+
+
+def test_section_search(tmp_path):
+    index = SectionSearchIndex()
+    index.add_section('a', '1', 'HYDRAULIC SYSTEM the hydraulic pump pressure is monitored')
+    index.add_section('a', '2', 'ELECTRICAL SYSTEM the pump relay is powered')
+    index.add_section('b', '1', 'pressure pump hydraulic')
+    assert [hit.link_idx for hit in index.search('hydraulic', doc_ids=['a'])] == ['1']
+    assert [(hit.doc_id, hit.link_idx) for hit in index.search('"hydraulic pump"')] == [('a', '1')]
+    assert index.search('"pump hydraulic" relay') == [SearchHit(doc_id='b', link_idx='1', score=index.search('"pump hydraulic"')[0].score)]
+    assert index.search('"missing phrase"') == []
+    index.add_section('a', '2', 'ELECTRICAL SYSTEM')
+    assert [hit.doc_id for hit in index.search('relay')] == []
+    index.save(tmp_path / 'search.zidx')
+    loaded_index = SectionSearchIndex.load(tmp_path / 'search.zidx')
+    assert loaded_index.search('pump pressure') == index.search('pump pressure')
+    index.remove_document('b')
+    assert len(index) == 2 and [hit.doc_id for hit in index.search('pump')] == ['a']
+    # removals only drop the postings of the removed sections, also after a load
+    loaded_index.remove_section('b', '1')
+    assert loaded_index.search('pump') == index.search('pump')
+    assert 'relay' not in index._postings and 'relay' not in loaded_index._postings
+
+    # store managed index, corrupt or truncated files are not loaded
+    store = ZPDFCache(str(tmp_path / 'store'))
+    assert store.load_search_index() is None
+    store.save_search_index(index)
+    assert store.load_search_index().search('pump') == index.search('pump')
+    index_bytes = index.to_bytes()
+    for corrupt_bytes in (index_bytes[:len(index_bytes) // 2], b'not an index', zlib.compress(b'[]')):
+        assert SectionSearchIndex.from_bytes(corrupt_bytes) is None
+    store.clear()
+    assert store.load_search_index() is None
+
+
+def test_section_retrieval(tmp_path):
+    file_path = 'data/sample_mac_6.pdf'
+    zpdf = ZPDF(file_path=file_path)
+    for embedder in [None, TfidfEmbedder()]:
+        index = SectionVectorIndex(embedder)
+        index.add_documents({'a': zpdf})
+        assert len(index) > 0
+        toc_tree_node = zpdf.find_toc_tree_node('8.9.3')
+        hit = index.search(zpdf.get_toc_node_text(toc_tree_node), top_k=1)[0]
+        assert hit.link_idx == '8.9.3' and toc_tree_node.start_page <= hit.start_page <= hit.end_page
+        index.save(tmp_path / 'vectors')
+        loaded_index = SectionVectorIndex.load(tmp_path / 'vectors')
+        assert loaded_index.search_batch(['general', 'limitations'], top_k=3) == index.search_batch(['general', 'limitations'], top_k=3)
+        loaded_index.remove_document('a')
+        assert len(loaded_index) == 0 and loaded_index.search('general') == []
+
+
 def _test_create_cache_file_function():
     file_path = 'data/sample_mac_6.pdf'
     zpdf = ZPDF(file_path=file_path)
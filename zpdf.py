@@ -1,8 +1,38 @@
+import os
 import fitz
 import re
+import sys
+import json
+import mmap
+import array
 import string
-from typing import Optional
+import zlib
+import struct
+import hashlib
+import weakref
+from collections import deque, OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Iterator, Optional
 from pydantic import BaseModel
+from zpdf_events import EventSink, PrintSink, Instrumentation
+
+
+DEFAULT_ALLOWED_HEADER_CHARS = string.ascii_uppercase + string.ascii_lowercase + ' .' + string.digits
+DEFAULT_SHORT_LINK_THRESHOLD = 50
+DEFAULT_TOC_REGION_MIN_LINKS = 5
+# sections with fewer inner pages are extracted in the calling thread even if a page pool is set
+DEFAULT_PARALLEL_MIN_PAGES = 64
+DEFAULT_PARALLEL_CHUNK_PAGES = 16
+HASH_CHUNK_BYTES = 1 << 20
+
+# in memory PDF inputs, passed to fitz without copying
+PdfStream = bytes | bytearray | memoryview | mmap.mmap
+# events are printed in the original log format unless another sink (or None) is given
+DEFAULT_EVENT_SINK = PrintSink()
+# link text marker for doc intermediate short links in the TOC page links cache
+_SHORT_LINK_TEXT = '\x00'
+# bump when parser output changes, caches created by older parser versions are invalidated
+PARSER_VERSION = 2
 
 
 class TocLink(BaseModel):
@@ -19,22 +49,606 @@ class TocTreeNode(BaseModel):
     start_page: int
     end_page: int = -1
     end_tag: Optional[str] = None
+    # flattened boundary page text offsets, None when not indexed (see ZPDF.index_text_offsets)
+    start_char: Optional[int] = None
+    end_char: Optional[int] = None
     children: list['TocTreeNode'] = []
 
 
+class TocTreeDiff(BaseModel):
+    ''' TOC keys that changed between two revisions of a PDF, see ZPDF.update '''
+    added: list[str]
+    removed: list[str]
+    modified: list[str]
+    reused_toc_pages: int
+    scanned_toc_pages: int
+
+
+class _TocLink:
+    ''' Lightweight internal TocLink used on the parsing hot path '''
+    __slots__ = ('link_idx', 'link_label', 'target_page', 'next_link_page', 'next_link_idx')
+
+    def __init__(self, link_idx: str, link_label: str, target_page: int, next_link_page: int = -1, next_link_idx: str | None = None):
+        self.link_idx = link_idx
+        self.link_label = link_label
+        self.target_page = target_page
+        self.next_link_page = next_link_page
+        self.next_link_idx = next_link_idx
+
+    def to_model(self) -> TocLink:
+        return TocLink.model_construct(**{field: getattr(self, field) for field in _TocLink.__slots__})
+
+    def __repr__(self) -> str:
+        return repr(self.to_model())
+
+
+class _DeleteCharsTable(dict):
+    ''' str.translate table that keeps the allowed chars and deletes any other char, deletions are memoized '''
+    def __init__(self, allowed_chars: str):
+        super().__init__((ord(c), ord(c)) for c in allowed_chars)
+
+    def __missing__(self, code_point: int) -> None:
+        self[code_point] = None
+        return None
+
+
+class LinkClassifier:
+    ''' Precompiled link text normalization and TOC header matching, one instance per document family '''
+    TOC_DOTS_PATTERN = '.' * 5
+
+    allowed_header_chars: str
+    short_link_threshold: int
+    _delete_chars_table: _DeleteCharsTable
+
+    _mixed_word_pattern = re.compile(r'\b(?=\w*\d)(?=\w*[A-Za-z])[A-Za-z0-9]+\b')
+    _digit_pattern = re.compile(r'\d')
+    _header_pattern = re.compile(r'((\d+\.?(?:\.\d+)*)[A-Za-z ]+)')
+
+    def __init__(self, allowed_header_chars: str = DEFAULT_ALLOWED_HEADER_CHARS, short_link_threshold: int = DEFAULT_SHORT_LINK_THRESHOLD):
+        self.allowed_header_chars = allowed_header_chars
+        self.short_link_threshold = short_link_threshold
+        self._delete_chars_table = _DeleteCharsTable(allowed_header_chars)
+
+    def normalize(self, link_text: str) -> str:
+        ''' Keep the allowed header chars, doc intermediate short links are returned as _SHORT_LINK_TEXT '''
+        if len(link_text) < self.short_link_threshold:
+            return _SHORT_LINK_TEXT
+        return link_text.translate(self._delete_chars_table)
+
+    def match(self, link_text: str) -> tuple[str, str] | None:
+        ''' (header label, header index) of a TOC link text, None if it is not a TOC header '''
+        toc_dots_start = link_text.find(LinkClassifier.TOC_DOTS_PATTERN)
+        if toc_dots_start != -1:
+            link_text = link_text[:toc_dots_start]
+        # link_text contains chars and digits: T3E2ST, B737800
+        if LinkClassifier._mixed_word_pattern.search(link_text):
+            idx = link_text.split(' ')[0]
+            if LinkClassifier._digit_pattern.search(idx):
+                return link_text, idx
+
+        # link_text contains only chars
+        header_match = LinkClassifier._header_pattern.match(link_text)
+        if not header_match:
+            return None
+        _link_text, idx = header_match.groups()
+        if _link_text.strip() == idx:  # ignore garbage links: '33.3.3 '
+            return None
+        # fix x. pattern in top level toc headers
+        if idx.endswith('.'):
+            idx = idx[:-1]
+        return _link_text, idx
+
+
+class _TocNode:
+    ''' Lightweight internal TocTreeNode, pydantic models are only built at the public API boundary
+
+    the model of a node is weakly cached, shared by lookups and by the model of its parent only while a caller holds it
+    '''
+    __slots__ = ('link_idx', 'link_label', 'start_page', 'end_page', 'end_tag', 'start_char', 'end_char', 'children', '_model')
+
+    def __init__(
+        self,
+        link_idx: str,
+        link_label: str,
+        start_page: int,
+        end_page: int = -1,
+        end_tag: str | None = None,
+        children: list['_TocNode'] | None = None,
+        start_char: int | None = None,
+        end_char: int | None = None,
+    ):
+        self.link_idx = link_idx
+        self.link_label = link_label
+        self.start_page = start_page
+        self.end_page = end_page
+        self.end_tag = end_tag
+        self.start_char = start_char
+        self.end_char = end_char
+        self.children = children if children is not None else []
+        self._model = None
+
+    @classmethod
+    def from_dict(cls, cache_node: dict) -> '_TocNode':
+        return cls(
+            link_idx=cache_node['link_idx'],
+            link_label=cache_node['link_label'],
+            start_page=cache_node['start_page'],
+            end_page=cache_node.get('end_page', -1),
+            end_tag=cache_node.get('end_tag'),
+            children=[cls.from_dict(child) for child in cache_node.get('children', [])],
+            start_char=cache_node.get('start_char'),
+            end_char=cache_node.get('end_char'),
+        )
+
+    @classmethod
+    def from_model(cls, node: TocTreeNode) -> '_TocNode':
+        return cls(node.link_idx, node.link_label, node.start_page, node.end_page, node.end_tag, [cls.from_model(child) for child in node.children], node.start_char, node.end_char)
+
+    def to_model(self) -> TocTreeNode:
+        ''' Models are only weakly referenced, a model is reused while a caller (or a parent model) still holds it '''
+        model = self._model() if self._model is not None else None
+        if model is None:
+            model = TocTreeNode.model_construct(
+                link_idx=self.link_idx,
+                link_label=self.link_label,
+                start_page=self.start_page,
+                end_page=self.end_page,
+                end_tag=self.end_tag,
+                start_char=self.start_char,
+                end_char=self.end_char,
+                children=[child.to_model() for child in self.children],
+            )
+            self._model = weakref.ref(model)
+        return model
+
+    def to_dict(self) -> dict:
+        ''' Same output as TocTreeNode.model_dump, text offsets are only written once indexed '''
+        node_dict = {
+            'link_idx': self.link_idx,
+            'link_label': self.link_label,
+            'start_page': self.start_page,
+            'end_page': self.end_page,
+            'end_tag': self.end_tag,
+        }
+        if self.start_char is not None:
+            node_dict['start_char'] = self.start_char
+            node_dict['end_char'] = self.end_char
+        node_dict['children'] = [child.to_dict() for child in self.children]
+        return node_dict
+
+
+class PageTextCache:
+    ''' LRU cache for page text, bounded by a page count and an optional byte budget '''
+    max_pages: int
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    _pages: OrderedDict[int, str]
+    _size_bytes: int
+
+    def __init__(self, max_pages: int = 256, max_bytes: int = 0):
+        ''' max_bytes = 0 disables the byte budget '''
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pages = OrderedDict()
+        self._size_bytes = 0
+
+    def get(self, page_number: int) -> str | None:
+        page_text = self._pages.get(page_number)
+        if page_text is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pages.move_to_end(page_number)
+        return page_text
+
+    def put(self, page_number: int, page_text: str):
+        if self.max_pages <= 0:
+            return
+        if page_number in self._pages:
+            self._size_bytes -= sys.getsizeof(self._pages.pop(page_number))
+        self._pages[page_number] = page_text
+        self._size_bytes += sys.getsizeof(page_text)
+        while self._pages and (len(self._pages) > self.max_pages or (self.max_bytes and self._size_bytes > self.max_bytes)):
+            _, evicted_text = self._pages.popitem(last=False)
+            self._size_bytes -= sys.getsizeof(evicted_text)
+            self.evictions += 1
+
+    def clear(self):
+        self._pages.clear()
+        self._size_bytes = 0
+
+    def get_stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'pages': len(self._pages),
+            'size_bytes': self._size_bytes,
+        }
+
+
+def compute_cache_key(file_path: str, short_link_threshold: int = DEFAULT_SHORT_LINK_THRESHOLD, allowed_header_chars: str = DEFAULT_ALLOWED_HEADER_CHARS) -> str:
+    ''' Hash of the PDF bytes, the parser version and settings, a cache is only valid for the same key '''
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            hasher.update(chunk)
+    hasher.update(json.dumps([PARSER_VERSION, short_link_threshold, allowed_header_chars]).encode())
+    return hasher.hexdigest()
+
+
+def compute_stream_cache_key(stream: PdfStream, short_link_threshold: int = DEFAULT_SHORT_LINK_THRESHOLD, allowed_header_chars: str = DEFAULT_ALLOWED_HEADER_CHARS) -> str:
+    ''' compute_cache_key of an in memory PDF, the buffer is hashed in slices without copying '''
+    hasher = hashlib.sha256()
+    with memoryview(stream).cast('B') as buffer:
+        for offset in range(0, len(buffer), HASH_CHUNK_BYTES):
+            hasher.update(buffer[offset:offset + HASH_CHUNK_BYTES])
+    hasher.update(json.dumps([PARSER_VERSION, short_link_threshold, allowed_header_chars]).encode())
+    return hasher.hexdigest()
+
+
+# page pool worker state, each worker process keeps its own handles on the most recently used files
+_PAGE_WORKER_MAX_DOCS = 8
+_page_worker_docs: OrderedDict[tuple[str, int, int], fitz.Document] = OrderedDict()
+
+
+def _get_pages_text(file_path: str, page_numbers: range) -> list[str]:
+    ''' Page pool task, same text as ZPDF._get_page_text '''
+    file_stat = os.stat(file_path)
+    doc_key = (file_path, file_stat.st_mtime_ns, file_stat.st_size)
+    doc = _page_worker_docs.get(doc_key)
+    if doc is None:
+        doc = _page_worker_docs[doc_key] = fitz.open(file_path)
+        while len(_page_worker_docs) > _PAGE_WORKER_MAX_DOCS:
+            _page_worker_docs.popitem(last=False)[1].close()
+    _page_worker_docs.move_to_end(doc_key)
+    return [doc.load_page(page_number).get_text() for page_number in page_numbers]
+
+
+def _get_compressed_pages_text(file_path: str, page_numbers: range) -> list[bytes]:
+    ''' Page pool task for PageTextStore builds, pages are compressed in the worker '''
+    return [PageTextStore.compress(page_text) for page_text in _get_pages_text(file_path, page_numbers)]
+
+
+def create_page_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    ''' Process pool for ZPDF(page_pool=..., page_pool_workers=workers), can be shared by many documents '''
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+class CompactTocTree:
+    ''' Versioned binary TOC tree cache made of flat arrays, nodes are stored in pre-order with parent offsets
+
+    layout (little endian):
+        header: magic, version, node count, cache key, meta length, update state length
+        meta: json encoded document metrics
+        int32 arrays: start_page, end_page, parent (-1 for root nodes), start_char, end_char (-2 when not indexed)
+        uint32 offset arrays (node count + 1): link_idx, link_label, end_tag
+        utf-8 string blobs: link_idx, link_label, end_tag (empty end_tag means None)
+        update state: zlib compressed json of the page hashes and the TOC page link texts by page fingerprint (may be empty), only decoded by ZPDF.update
+    '''
+    MAGIC = b'ZTOC'
+    VERSION = 4
+    NO_TEXT_OFFSET = -2
+    _header = struct.Struct('<4sHHI32sII')
+
+    cache_key: str
+    meta: dict
+    start_pages: memoryview | array.array
+    end_pages: memoryview | array.array
+    parents: memoryview | array.array
+    start_chars: memoryview | array.array
+    end_chars: memoryview | array.array
+    _offsets: list[memoryview | array.array]
+    _blobs: list[bytes | memoryview]
+    update_state: bytes | memoryview
+    _buffer: mmap.mmap | bytes | None
+
+    def __init__(self, cache_key: str, meta: dict, int_arrays: list, offsets: list, blobs: list, update_state: bytes | memoryview = b'', buffer: mmap.mmap | bytes | None = None):
+        self.cache_key = cache_key
+        self.meta = meta
+        self.start_pages, self.end_pages, self.parents, self.start_chars, self.end_chars = int_arrays
+        self._offsets = offsets
+        self._blobs = blobs
+        self.update_state = update_state
+        self._buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self.start_pages)
+
+    def _get_string(self, field: int, node_id: int) -> str:
+        offsets = self._offsets[field]
+        return bytes(self._blobs[field][offsets[node_id]:offsets[node_id + 1]]).decode()
+
+    def link_idx(self, node_id: int) -> str:
+        return self._get_string(0, node_id)
+
+    def link_label(self, node_id: int) -> str:
+        return self._get_string(1, node_id)
+
+    def end_tag(self, node_id: int) -> str | None:
+        return self._get_string(2, node_id) or None
+
+    @staticmethod
+    def encode_update_state(page_hashes: list[str], page_links: dict[str, list[str | None]]) -> bytes:
+        return zlib.compress(json.dumps({'page_hashes': page_hashes, 'page_links': page_links}, separators=(',', ':')).encode())
+
+    @staticmethod
+    def decode_update_state(update_state: bytes | memoryview) -> tuple[list[str] | None, dict[str, list[str | None]]]:
+        ''' Page hashes (None if unknown) and TOC page link texts of the cached revision '''
+        if not len(update_state):
+            return None, {}
+        state = json.loads(zlib.decompress(update_state))
+        return state['page_hashes'], state['page_links']
+
+    @classmethod
+    def from_toc_tree(cls, toc_tree: list[TocTreeNode] | list[_TocNode], cache_key: str = '', meta: dict | None = None, update_state: bytes = b'') -> 'CompactTocTree':
+        ''' update_state is an encode_update_state output '''
+        int_arrays = [array.array('i') for _ in range(5)]
+        offsets = [array.array('I', [0]), array.array('I', [0]), array.array('I', [0])]
+        blobs = [bytearray(), bytearray(), bytearray()]
+        stack: list[tuple[TocTreeNode | _TocNode, int]] = [(node, -1) for node in reversed(toc_tree)]
+        while stack:
+            node, parent_id = stack.pop()
+            node_id = len(int_arrays[0])
+            start_char = CompactTocTree.NO_TEXT_OFFSET if node.start_char is None else node.start_char
+            end_char = CompactTocTree.NO_TEXT_OFFSET if node.end_char is None else node.end_char
+            for int_array, value in zip(int_arrays, (node.start_page, node.end_page, parent_id, start_char, end_char)):
+                int_array.append(value)
+            for field, value in enumerate((node.link_idx, node.link_label, node.end_tag or '')):
+                blobs[field] += value.encode()
+                offsets[field].append(len(blobs[field]))
+            stack += [(child, node_id) for child in reversed(node.children)]
+        return cls(cache_key, meta or {}, int_arrays, offsets, [bytes(blob) for blob in blobs], update_state)
+
+    def _build_tree(self, node_factory: Callable) -> list:
+        roots = []
+        nodes = []
+        for node_id in range(len(self)):
+            node = node_factory(
+                link_idx=self.link_idx(node_id),
+                link_label=self.link_label(node_id),
+                start_page=self.start_pages[node_id],
+                end_page=self.end_pages[node_id],
+                end_tag=self.end_tag(node_id),
+                start_char=None if self.start_chars[node_id] == CompactTocTree.NO_TEXT_OFFSET else self.start_chars[node_id],
+                end_char=None if self.end_chars[node_id] == CompactTocTree.NO_TEXT_OFFSET else self.end_chars[node_id],
+                children=[],
+            )
+            nodes.append(node)
+            parent_id = self.parents[node_id]
+            if parent_id == -1:
+                roots.append(node)
+            else:
+                nodes[parent_id].children.append(node)
+        return roots
+
+    def to_toc_tree(self) -> list[TocTreeNode]:
+        return self._build_tree(TocTreeNode.model_construct)
+
+    def to_cache(self) -> list[dict]:
+        ''' JSON export, same format as ZPDF.get_cache '''
+        return [root_node.to_dict() for root_node in self._build_tree(_TocNode)]
+
+    def to_bytes(self) -> bytes:
+        meta = json.dumps(self.meta).encode()
+        meta += b' ' * (-len(meta) % 4)  # keep arrays 4 bytes aligned
+        parts = [
+            self._header.pack(self.MAGIC, self.VERSION, 0, len(self), bytes.fromhex(self.cache_key or '0' * 64), len(meta), len(self.update_state)),
+            meta,
+        ]
+        for values in (self.start_pages, self.end_pages, self.parents, self.start_chars, self.end_chars):
+            parts.append(array.array('i', values))
+        for offsets in self._offsets:
+            parts.append(array.array('I', offsets))
+        if sys.byteorder != 'little':
+            for part in parts[2:]:
+                part.byteswap()
+        parts = [bytes(part) for part in parts]
+        for blob in self._blobs:
+            blob = bytes(blob)
+            parts.append(blob + b'\0' * (-len(blob) % 4))
+        parts.append(bytes(self.update_state))
+        return b''.join(parts)
+
+    def dump(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, buffer: mmap.mmap | bytes, cache_key: str | None = None) -> 'CompactTocTree | None':
+        ''' Returns None if the buffer is not a valid cache for this version and cache key, every section size is checked against the buffer size '''
+        if len(buffer) < cls._header.size:
+            return None
+        magic, version, _, node_count, key_digest, meta_len, update_state_len = cls._header.unpack_from(buffer, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            return None
+        if cache_key is not None and key_digest.hex() != cache_key:
+            return None
+        # truncated or padded buffers, the string blob sizes are only known once the offsets are read
+        arrays_end = cls._header.size + meta_len + node_count * 5 * 4 + (node_count + 1) * 3 * 4
+        if meta_len % 4 or arrays_end + update_state_len > len(buffer):
+            return None
+
+        view = memoryview(buffer)
+        pos = cls._header.size
+        try:
+            meta = json.loads(bytes(view[pos:pos + meta_len]))
+        except ValueError:
+            return None
+        pos += meta_len
+
+        def read_array(typecode: str, count: int) -> memoryview | array.array:
+            nonlocal pos
+            size = count * 4
+            values = view[pos:pos + size].cast(typecode)
+            pos += size
+            if sys.byteorder != 'little':
+                values = array.array(typecode, values)
+                values.byteswap()
+            return values
+
+        int_arrays = [read_array('i', node_count) for _ in range(5)]
+        offsets = [read_array('I', node_count + 1) for _ in range(3)]
+        if pos + sum(field_offsets[-1] + (-field_offsets[-1] % 4) for field_offsets in offsets) + update_state_len != len(buffer):
+            return None
+        blobs = []
+        for field_offsets in offsets:
+            blob_len = field_offsets[-1]
+            blobs.append(view[pos:pos + blob_len])
+            pos += blob_len + (-blob_len % 4)
+        return cls(key_digest.hex(), meta, int_arrays, offsets, blobs, view[pos:], buffer)
+
+    @classmethod
+    def load(cls, path: str, cache_key: str | None = None) -> 'CompactTocTree | None':
+        ''' Memory map a cache file, returns None if the file is stale or not a valid cache '''
+        with open(path, 'rb') as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return None
+        return cls.from_bytes(buffer, cache_key)
+
+
+class PageTextStore:
+    ''' Versioned store of zlib compressed page texts, pages are read one at a time without the PDF
+
+    layout (little endian):
+        header: magic, version, page count, cache key
+        uint32 offset array (page count + 1): compressed page bounds in the data section
+        data: zlib compressed utf-8 page texts
+    '''
+    MAGIC = b'ZTXT'
+    VERSION = 1
+    _header = struct.Struct('<4sHHI32s')
+
+    cache_key: str
+    _offsets: memoryview | array.array
+    _data: bytes | memoryview
+    _buffer: mmap.mmap | bytes | None
+
+    def __init__(self, cache_key: str, offsets: memoryview | array.array, data: bytes | memoryview, buffer: mmap.mmap | bytes | None = None):
+        self.cache_key = cache_key
+        self._offsets = offsets
+        self._data = data
+        self._buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def page_count(self) -> int:
+        return len(self)
+
+    @staticmethod
+    def compress(page_text: str) -> bytes:
+        return zlib.compress(page_text.encode('utf-8', 'surrogatepass'))
+
+    def get_page_text(self, page_number: int) -> str:
+        if not 0 <= page_number < len(self):
+            raise IndexError(f"page {page_number} not in store of {len(self)} pages")
+        return zlib.decompress(self._data[self._offsets[page_number]:self._offsets[page_number + 1]]).decode('utf-8', 'surrogatepass')
+
+    def iter_pages_text(self, page_numbers: range) -> Iterator[str]:
+        for page_number in page_numbers:
+            yield self.get_page_text(page_number)
+
+    @classmethod
+    def from_pages(cls, compressed_pages: list[bytes], cache_key: str = '') -> 'PageTextStore':
+        offsets = array.array('I', [0])
+        for compressed_page in compressed_pages:
+            offsets.append(offsets[-1] + len(compressed_page))
+        return cls(cache_key, offsets, b''.join(compressed_pages))
+
+    def to_bytes(self) -> bytes:
+        offsets = array.array('I', self._offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        return b''.join([
+            self._header.pack(self.MAGIC, self.VERSION, 0, len(self), bytes.fromhex(self.cache_key or '0' * 64)),
+            bytes(offsets),
+            bytes(self._data),
+        ])
+
+    def dump(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, buffer: mmap.mmap | bytes, cache_key: str | None = None) -> 'PageTextStore | None':
+        ''' Returns None if the buffer is not a valid store for this version and cache key, the section sizes are checked against the buffer size '''
+        if len(buffer) < cls._header.size:
+            return None
+        magic, version, _, page_count, key_digest = cls._header.unpack_from(buffer, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            return None
+        if cache_key is not None and key_digest.hex() != cache_key:
+            return None
+
+        pos = cls._header.size + (page_count + 1) * 4
+        if pos > len(buffer):
+            return None
+        view = memoryview(buffer)
+        offsets = view[cls._header.size:pos].cast('I')
+        if sys.byteorder != 'little':
+            offsets = array.array('I', offsets)
+            offsets.byteswap()
+        # truncated or padded data section
+        if pos + offsets[-1] != len(buffer):
+            return None
+        return cls(key_digest.hex(), offsets, view[pos:], buffer)
+
+    @classmethod
+    def load(cls, path: str, cache_key: str | None = None) -> 'PageTextStore | None':
+        ''' Memory map a store file, returns None if the file is stale or not a valid store '''
+        with open(path, 'rb') as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return None
+        return cls.from_bytes(buffer, cache_key)
+
+
 class ZPDF:
     ''' This class converts PDFs to indexable data structure '''
-    doc: fitz.Document
+    file_path: str
     allowed_header_chars: str
     short_link_threshold: int
     toc_headers_count: int
     coverage_metric: float
     toc_pages: set[int]
-    toc_tree: list[TocTreeNode]
+    toc_region: list[int] | None
+    toc_region_min_links: int
     untitled_labels_count: int
     link_gap_count: int
+    page_cache: PageTextCache
+    source_path: str | None
+    _stream: memoryview | None
+    text_store: PageTextStore | None
+    page_pool: Executor | None
+    page_pool_workers: int | None
+    parallel_min_pages: int
+    parallel_chunk_pages: int
+    parallel_max_chunks: int | None
+    link_classifier: LinkClassifier
+    instrumentation: Instrumentation
+    _parse_timings: dict[str, float]
+    _parse_counters: dict[str, int]
+    _toc_page_links: dict[str, list[str | None]]
+    _page_hashes: list[str] | None
+    _cached_update_state: bytes
+    _reusable_page_links: dict[str, list[str | None]]
     _link_idx_set: set
     _last_link_idx: str
+    _doc: fitz.Document | None
+    _toc_tree: list[_TocNode]
+    _toc_index: dict[str, _TocNode]
+    _toc_parents: dict[str, _TocNode | None]
+    _toc_siblings: dict[str, tuple[_TocNode | None, _TocNode | None]]
 
     @staticmethod
     def _toc_dots_clean(text: str) -> str:
@@ -43,53 +657,36 @@ class ZPDF:
             return text.split(toc_dots_pattern)[0]
         return text
 
-    @staticmethod
-    def _link_pattern_match(link_text: str) -> tuple[str, str] | None:
-        link_text = ZPDF._toc_dots_clean(link_text)
-        # link_text contains chars and digits: T3E2ST, B737800
-        if re.findall(r'\b(?=\w*\d)(?=\w*[A-Za-z])[A-Za-z0-9]+\b', link_text):
-            idx = link_text.split(' ')[0]
-            if re.findall(r'\d+\.?(?:\.\d+)*', idx):
-                return link_text, idx
+    def _get_link_text(self, page: fitz.Page, link: fitz.Link) -> str:
+        self.instrumentation.count('link_texts_extracted')
+        return self.link_classifier.normalize(page.get_textbox(link.rect))
 
-        # link_text contains only chars
-        matches: list[tuple[str, str]] = re.findall(r'^((\d+\.?(?:\.\d+)*)[A-Za-z ]+)', link_text)
-        if not matches or len(matches[0]) != 2:
-            return None
-        _link_text, idx = matches[0]
-        if _link_text.strip() == idx:  # ignore garbage links: '33.3.3 '
-            return None
-        # fix x. pattern in top level toc headers
-        if idx.split('.')[-1] == '':
-            idx = idx[:-1]
-        return _link_text, idx
-
-    def _parse_link(self, page: fitz.Page, link: fitz.Link) -> TocLink | None:
+    def _parse_link(self, page: fitz.Page, link: fitz.Link, link_text: str | None = None) -> _TocLink | None:
+        ''' link_text is the cached _get_link_text output if any '''
         src_page_number = page.number
         des_page_number = int(link.dest.page)
         # remove backward links
         if des_page_number < src_page_number:
             return None
 
-        link_text = page.get_textbox(link.rect)
-        if len(link_text) < self.short_link_threshold:  # ignore doc intermediate short links
+        if link_text is None:
+            link_text = self._get_link_text(page, link)
+        if link_text == _SHORT_LINK_TEXT:
             return None
-
-        link_text = ''.join([c for c in link_text if c in self.allowed_header_chars])
         self.toc_pages.add(page.number)
-        link_parts_match = self._link_pattern_match(link_text.strip())
+        link_parts_match = self.link_classifier.match(link_text.strip())
         if not link_parts_match:
             return None
         link_text, idx = link_parts_match
 
         # only keep unique toc headers
         if idx in self._link_idx_set:
-            print(idx, 'Duplicate')
+            self.instrumentation.emit('duplicate_link', link_idx=idx)
             return None
         self._link_idx_set.add(idx)
-        return TocLink(link_idx=idx, link_label=link_text, target_page=des_page_number)
+        return _TocLink(link_idx=idx, link_label=link_text, target_page=des_page_number)
 
-    def _fill_next_link_page(self, links: list[TocLink]) -> list[TocLink]:
+    def _fill_next_link_page(self, links: list[_TocLink]) -> list[_TocLink]:
         for idx, link in enumerate(links):
             if idx < len(links) - 1:
                 link.next_link_page = links[idx + 1].target_page
@@ -97,119 +694,277 @@ class ZPDF:
         self._last_link_idx = links[-1].link_idx
         return links
 
-    def _extract_toc_links(self) -> list[TocLink]:
-        toc_links = []
+    @staticmethod
+    def _detect_toc_region(forward_link_counts: list[int], min_links: int) -> list[int]:
+        ''' TOC pages are link dense pages plus their direct neighbours that hold forward links (short first/last TOC pages)
+
+        a page is link dense if it holds at least min_links and a quarter of the densest page links, this keeps body pages full of cross references out
+        '''
+        if not forward_link_counts:
+            return []
+        dense_threshold = max(min_links, -(-max(forward_link_counts) // 4))
+        toc_region = set()
+        for page_number, link_count in enumerate(forward_link_counts):
+            if link_count < dense_threshold:
+                continue
+            toc_region.add(page_number)
+            for neighbour_page_number in (page_number - 1, page_number + 1):
+                if 0 <= neighbour_page_number < len(forward_link_counts) and forward_link_counts[neighbour_page_number] > 0:
+                    toc_region.add(neighbour_page_number)
+        return sorted(toc_region)
+
+    def _count_forward_links(self) -> list[int]:
+        ''' Cheap pass that only reads link destinations, no text is extracted '''
+        forward_link_counts = []
         for page in self.doc:
+            link_count = 0
+            link = page.first_link
+            while link:
+                if link.dest.page >= page.number:
+                    link_count += 1
+                link = link.next
+            forward_link_counts.append(link_count)
+        return forward_link_counts
+
+    def _get_page_fingerprint(self, page_number: int, links: list[fitz.Link]) -> str:
+        ''' Page content hash, link rects and parser settings, link texts of a page only depend on these '''
+        page_hash = hashlib.sha1(self._page_hashes[page_number].encode())
+        page_hash.update(repr(([tuple(link.rect) for link in links], self.short_link_threshold, self.allowed_header_chars)).encode())
+        return page_hash.hexdigest()
+
+    def _scan_toc_links(self, page_numbers: list[int] | range) -> list[_TocLink]:
+        ''' Link texts of TOC pages are kept per page fingerprint, unchanged TOC pages of the previous revision are not read again during update
+
+        fingerprints are only computed for TOC pages, and for every scanned page while update has link texts to reuse
+        '''
+        self._link_idx_set = set()
+        self.toc_pages = set()
+        toc_links = []
+        for page_number in page_numbers:
+            page = self.doc.load_page(page_number)
+            links = []
             link = page.first_link
             while link:
-                toc_link = self._parse_link(page, link)
+                links.append(link)
+                link = link.next
+            self.instrumentation.count('pages_scanned')
+            self.instrumentation.count('links_scanned', len(links))
+            fingerprint = self._get_page_fingerprint(page_number, links) if self._reusable_page_links else None
+            link_texts = (fingerprint and self._reusable_page_links.get(fingerprint)) or [None] * len(links)
+            page_toc_links_count = len(toc_links)
+            for link_number, link in enumerate(links):
+                # link text is only extracted for forward links
+                if link_texts[link_number] is None and int(link.dest.page) >= page_number:
+                    link_texts[link_number] = self._get_link_text(page, link)
+                toc_link = self._parse_link(page, link, link_texts[link_number])
                 if toc_link:
                     toc_links.append(toc_link)
-                link = link.next
+            # only TOC pages are kept, the cache stays small when the full scan fallback runs
+            if len(toc_links) > page_toc_links_count:
+                self._toc_page_links[fingerprint or self._get_page_fingerprint(page_number, links)] = link_texts
+        return toc_links
+
+    def _extract_toc_links(self) -> list[_TocLink]:
+        # only scan the detected TOC region, fallback to a full scan if detection fails
+        self.toc_region = ZPDF._detect_toc_region(self._count_forward_links(), self.toc_region_min_links) or None
+        toc_links = self._scan_toc_links(self.toc_region) if self.toc_region else []
+        if not toc_links:
+            self.toc_region = None
+            toc_links = self._scan_toc_links(range(self.doc.page_count))
         toc_links = self._fill_next_link_page(toc_links)
         return toc_links
 
     @staticmethod
     def _compute_link_level(link_idx: str) -> int:
-        return sum([1 for c in link_idx if c == '.'])
-
-    def _build_toc_tree(self, links: list[TocLink], start_index: int, end_index: int, level: int) -> list[TocTreeNode]:
-        children = []
-        while start_index < end_index:
-            link = links[start_index]
-            link_level = ZPDF._compute_link_level(link.link_idx)
-            if link_level == level:
-                node = TocTreeNode(link_idx=link.link_idx, link_label=link.link_label, start_page=link.target_page)
-                # find node children
-                next_start = start_index + 1
-                while next_start < end_index:
-                    next_link_level = sum([1 for c in links[next_start].link_idx if c == '.'])
-                    if next_link_level <= level:
-                        break
-                    next_start += 1
-                # recursively build the subtree for the children
-                node.children = self._build_toc_tree(links, start_index + 1, next_start, level + 1)
-                # calculate end page of this node
+        return link_idx.count('.')
+
+    def _close_toc_node(self, node: _TocNode, link: _TocLink):
+        ''' Calculate end page of a node once all its children are closed '''
+        if node.children:
+            node.end_page = node.children[-1].end_page
+            node.end_tag = node.children[-1].end_tag
+            return
+        node.end_page = link.next_link_page
+        node.end_tag = link.next_link_idx
+        if node.start_page > node.end_page and node.link_idx != self._last_link_idx:
+            self.instrumentation.emit('invalid_node', link_idx=node.link_idx)
+
+    def _build_toc_tree(self, links: list[_TocLink]) -> list[_TocNode]:
+        ''' Single pass tree builder, the stack holds the open path from root to the last node
+
+        a link is attached to the open node one level above it, links that skip a level are dropped
+        '''
+        toc_tree = []
+        stack: list[tuple[int, _TocNode, _TocLink]] = []
+        for link, link_level in zip(links, [ZPDF._compute_link_level(link.link_idx) for link in links]):
+            while stack and stack[-1][0] >= link_level:
+                self._close_toc_node(*stack.pop()[1:])
+            parent_level = stack[-1][0] if stack else -1
+            if link_level != parent_level + 1:
+                continue
+            node = _TocNode(link.link_idx, link.link_label, link.target_page)
+            (stack[-1][1].children if stack else toc_tree).append(node)
+            stack.append((link_level, node, link))
+        while stack:
+            self._close_toc_node(*stack.pop()[1:])
+        return toc_tree
+
+    def _build_toc_index(self):
+        ''' Index toc tree nodes by key, only nodes reachable from the root that matches their key prefix are indexed '''
+        self._toc_index = {}
+        self._toc_parents = {}
+        self._toc_siblings = {}
+        queue = deque([(None, self._toc_tree)])
+        while queue:
+            parent, siblings = queue.popleft()
+            for idx, node in enumerate(siblings):
+                prev_node = siblings[idx - 1] if idx > 0 else None
+                next_node = siblings[idx + 1] if idx < len(siblings) - 1 else None
+                self._toc_parents.setdefault(node.link_idx, parent)
+                self._toc_siblings.setdefault(node.link_idx, (prev_node, next_node))
                 if node.children:
-                    node.end_page = node.children[-1].end_page
-                    node.end_tag = node.children[-1].end_tag
-                else:
-                    node.end_page = link.next_link_page
-                    node.end_tag = link.next_link_idx
-                    if node.start_page > node.end_page and node.link_idx != self._last_link_idx:
-                        print(node.link_idx, 'Invalid')
-                # append node to the list of children
-                children.append(node)
-                start_index = next_start
-            else:
-                start_index += 1
-        return children
+                    queue.append((node, node.children))
+
+        # keep first match in bfs order per root, same as the original root scoped traversal
+        for root_node in self._toc_tree:
+            queue = deque([root_node])
+            while queue:
+                node = queue.popleft()
+                if node.link_idx.split('.')[0] == root_node.link_idx:
+                    self._toc_index.setdefault(node.link_idx, node)
+                queue.extend(node.children)
+
+    def _set_toc_tree(self, toc_tree: list[_TocNode]):
+        self._toc_tree = toc_tree
+        self._build_toc_index()
+
+    @staticmethod
+    def _get_key_prefixes(key: str) -> list[str]:
+        ''' '8.1.7' -> ['8', '8.1', '8.1.7'] '''
+        key_parts = key.split('.')
+        return ['.'.join(key_parts[:i]) for i in range(1, len(key_parts) + 1)]
 
     @staticmethod
     def _remove_key_overlaps(keys: list[str]) -> list[str]:
-        ''' Filter TOC index keys overlaps by removing child keys from the list and only leaving top level keys '''
-        keys = keys.copy()
-        keys.sort()
+        ''' Filter TOC index keys overlaps by removing child keys from the list and only leaving top level keys
+
+        a key overlaps a kept key if it equals it or extends it by whole segments ('10' does not overlap '1')
+        '''
+        kept_keys = set()
+        non_overlapping = []
+        # ancestors sort before their children
+        for key in sorted(keys):
+            if any(prefix in kept_keys for prefix in ZPDF._get_key_prefixes(key)):
+                continue
+            kept_keys.add(key)
+            non_overlapping.append(key)
+        return non_overlapping
+
+    def _filter_key_overlaps(self, toc_keys: list[str]) -> list[str]:
+        ''' Same as _remove_key_overlaps but ancestors of indexed keys come from the tree parents instead of the key segments '''
+        requested_keys = set(toc_keys)
         non_overlapping = []
-        for key in keys:
-            if not non_overlapping or not any(key.startswith(v) for v in non_overlapping):
+        for key in sorted(requested_keys):
+            if key in self._toc_index:
+                parent = self._toc_parents.get(key)
+                while parent is not None and parent.link_idx not in requested_keys:
+                    parent = self._toc_parents.get(parent.link_idx)
+                if parent is None:
+                    non_overlapping.append(key)
+            elif not any(prefix in requested_keys for prefix in ZPDF._get_key_prefixes(key)[:-1]):
                 non_overlapping.append(key)
         return non_overlapping
 
-    def _validate_toc_tree(self, links: list[TocLink]) -> tuple[float, list[TocLink]]:
+    def _validate_toc_tree(self, links: list[_TocLink]) -> tuple[float, list[_TocLink]]:
         not_found_links = []
         for link in links:
-            node = self.find_toc_tree_node(link.link_idx)
+            node = self._toc_index.get(link.link_idx)
             if not node:
-                print(link.link_idx, 'not Found')
+                self.instrumentation.emit('link_not_found', link_idx=link.link_idx)
                 not_found_links.append(link)
                 continue
             if link.link_idx != node.link_idx:
-                print(link.link_idx, 'Mismatch')
+                self.instrumentation.emit('link_mismatch', link_idx=link.link_idx)
                 not_found_links.append(link)
         not_found_pct = len(not_found_links) / len(links)
         return 1 - not_found_pct, not_found_links
 
     @staticmethod
-    def _get_first_link_by_parent_key(parent_key: str, links: list[TocLink]) -> tuple[int, TocLink] | None:
-        search_res = [(idx, link) for idx, link in enumerate(links) if link.link_label.startswith(parent_key)]
-        if search_res:
-            return search_res[0]
-        return None
+    def _get_first_links_by_parent_keys(parent_keys: set[str], links: list[_TocLink]) -> dict[str, int]:
+        ''' Position of the first link whose label starts with each parent key, single pass over the links '''
+        remaining_keys = set(parent_keys)
+        first_links = {}
+        for link_number, link in enumerate(links):
+            if not remaining_keys:
+                break
+            for parent_key in [key for key in remaining_keys if link.link_label.startswith(key)]:
+                first_links[parent_key] = link_number
+                remaining_keys.remove(parent_key)
+        return first_links
 
-    def _try_find_untitled_header(self, link_idx: str) -> str:
-        def basic_search(lines: list[str]) -> str | None:
-            header_idx = [idx for idx, val in enumerate(lines) if val.strip() == link_idx or val.strip() == link_idx + '.']
-            if not header_idx:
-                return None
-            header_idx = header_idx[-1]
-            if header_idx == len(lines) - 1:
-                return None
-            return ''.join([lines[header_idx], lines[header_idx + 1]])
-
-        def advanced_search(lines: list[str]) -> str | None:
-            pattern = rf'^[A-Za-z]+\s+{link_idx}\s+[A-Za-z0-9 ]+'
-            transformed_lines = [''.join([c for c in line if c in self.allowed_header_chars]) for line in lines]
-            header_idx = [idx for idx, val in enumerate(transformed_lines) if re.findall(pattern, val)]
-            if not header_idx:
-                return None
-            header_idx = header_idx[-1]
-            return transformed_lines[header_idx]
+    def _build_toc_header_lookup(self) -> dict[str, str]:
+        ''' Header label candidates of every index found on the TOC pages, each page is split and filtered once
 
+        per page the basic search (index alone on its line, label on the next line) wins over the advanced search (index after a leading word), earlier pages win over later ones
+        '''
+        header_lookup = {}
+        disallowed_chars_pattern = re.compile(f"[^{re.escape(self.allowed_header_chars)}\n]")
+        advanced_pattern = re.compile(r'^[A-Za-z]+\s+(\S+)\s+[A-Za-z0-9 ]')
         for toc_page in self.toc_pages:
-            toc_page_text: str = self.doc.load_page(toc_page).get_text()
+            toc_page_text = self._get_page_text(toc_page)
             lines = toc_page_text.split('\n')
-            basic_search_res = basic_search(lines)
-            if basic_search_res:
-                return ZPDF._toc_dots_clean(basic_search_res)
-            advanced_search_res = advanced_search(lines)
-            if advanced_search_res:
-                return ZPDF._toc_dots_clean(advanced_search_res)
-
-        print('Can not Find Unlinked Index', link_idx)
+
+            # last line holding the index alone, with or without a trailing dot
+            basic_header_lines = {}
+            for line_number, line in enumerate(lines):
+                line = line.strip()
+                basic_header_lines[line] = line_number
+                if line.endswith('.'):
+                    basic_header_lines[line[:-1]] = line_number
+            for link_idx, line_number in basic_header_lines.items():
+                if line_number != len(lines) - 1:
+                    header_lookup.setdefault(link_idx, ZPDF._toc_dots_clean(''.join([lines[line_number], lines[line_number + 1]])))
+
+            # last filtered line holding the index after a leading word
+            advanced_header_lines = {}
+            for line in disallowed_chars_pattern.sub('', toc_page_text).split('\n'):
+                match = advanced_pattern.match(line)
+                if match:
+                    advanced_header_lines[match.group(1)] = line
+            for link_idx, line in advanced_header_lines.items():
+                header_lookup.setdefault(link_idx, ZPDF._toc_dots_clean(line))
+        return header_lookup
+
+    def _try_find_untitled_header(self, link_idx: str, header_lookup: dict[str, str] | None = None) -> str:
+        if header_lookup is None:
+            header_lookup = self._build_toc_header_lookup()
+        header = header_lookup.get(link_idx)
+        if header:
+            return header
+
+        self.instrumentation.emit('untitled_header', link_idx=link_idx)
         self.untitled_labels_count += 1
         return (link_idx + ' UNTITLED')
 
+    def _post_correct(self, toc_links: list[_TocLink], not_found_links: list[_TocLink]) -> list[_TocLink]:
+        ''' Insert the missing root links of not found links, labels are recovered from the TOC pages '''
+        missing_roots = {not_found_link.link_idx.split('.')[0] for not_found_link in not_found_links}
+        first_links = ZPDF._get_first_links_by_parent_keys(missing_roots, toc_links)
+        header_lookup = self._build_toc_header_lookup()
+        root_links: dict[int, list[_TocLink]] = {}
+        for root_key in sorted(first_links):
+            link = toc_links[first_links[root_key]]
+            root_links.setdefault(first_links[root_key], []).append(_TocLink(
+                link_idx=root_key,
+                link_label=self._try_find_untitled_header(root_key, header_lookup),
+                target_page=link.target_page,
+            ))
+        corrected_links = []
+        for link_number, link in enumerate(toc_links):
+            corrected_links += root_links.get(link_number, [])
+            corrected_links.append(link)
+        return corrected_links
+
     @staticmethod
     def _links_gap_check_by_idx(idx_list: list[str]) -> list[str]:
         ''' Check missing index keys in a link sequence '''
@@ -229,143 +984,592 @@ class ZPDF:
                 out_gap_list += [common_part + f".{g}" for g in range(idx_1_lsv + 1, idx_2_lsv)]
         return out_gap_list
 
-    def __init__(self, file_path: str, cache: list[dict] = []):
-        print('Initializing ZPDF for file:', file_path)
-        self.doc = fitz.open(file_path)
-        self.allowed_header_chars = string.ascii_uppercase + string.ascii_lowercase + ' .' + string.digits
-        self.short_link_threshold = 50
+    def _get_page_text(self, page_number: int) -> str:
+        page_text = self.page_cache.get(page_number)
+        if page_text is None:
+            if self.text_store is not None:
+                page_text = self.text_store.get_page_text(page_number)
+                self.instrumentation.count('store_pages_read')
+            else:
+                page_text = self.doc.load_page(page_number).get_text()
+                self.instrumentation.count('pages_loaded')
+            self.page_cache.put(page_number, page_text)
+        return page_text
+
+    def __init__(
+        self,
+        file_path: str,
+        cache: list[dict] | CompactTocTree | None = None,
+        page_cache: PageTextCache | None = None,
+        lazy: bool = False,
+        text_offsets: bool = False,
+        link_classifier: LinkClassifier | None = None,
+        sink: EventSink | None = DEFAULT_EVENT_SINK,
+        page_pool: Executor | None = None,
+        stream: PdfStream | None = None,
+        text_store: PageTextStore | None = None,
+        page_pool_workers: int | None = None,
+    ):
+        ''' lazy mode only applies when loading from cache: the tree is loaded without validation and the PDF is opened on first text access
+        text_offsets runs index_text_offsets after parsing
+        link_classifier holds the link text settings of the document family, defaults to LinkClassifier()
+        sink receives structured events (see zpdf_events), None disables them
+        page_pool (see create_page_pool) extracts the inner pages of sections longer than parallel_min_pages in worker processes
+        stream is an in memory PDF opened instead of file_path (see from_stream and from_mmap), file_path is then only its name
+        text_store (see get_text_store) serves page text instead of the PDF, a lazy ZPDF with a cache and a text store never opens the PDF for text
+        page_pool_workers is the worker count the page pool was created with (defaults to the cpu count like the pool), it sizes the window of chunks in flight
+        '''
+        self.instrumentation = Instrumentation(sink)
+        self.instrumentation.emit('init', file_path=file_path)
+        self._parse_timings = {}
+        self._parse_counters = {}
+        self.file_path = file_path
+        self._set_source(file_path, stream)
+        self.text_store = text_store
+        self._doc = None
+        if not (lazy and cache):
+            with self.instrumentation.timer('open'):
+                self._doc = self._open_doc()
+        self.link_classifier = link_classifier or LinkClassifier()
+        self.allowed_header_chars = self.link_classifier.allowed_header_chars
+        self.short_link_threshold = self.link_classifier.short_link_threshold
+        self.toc_region_min_links = DEFAULT_TOC_REGION_MIN_LINKS
+        self.toc_region = None
         self._link_idx_set = set()
+        self._toc_page_links = {}
+        self._page_hashes = None
+        self._cached_update_state = b''
+        self._reusable_page_links = {}
         self.toc_pages = set()
+        self.toc_headers_count = 0
+        self.coverage_metric = 0.0
         self.untitled_labels_count = 0
         self.link_gap_count = 0
+        self.page_cache = page_cache if page_cache is not None else PageTextCache()
+        self.page_pool = page_pool
+        self.page_pool_workers = page_pool_workers
+        self.parallel_min_pages = DEFAULT_PARALLEL_MIN_PAGES
+        self.parallel_chunk_pages = DEFAULT_PARALLEL_CHUNK_PAGES
+        self.parallel_max_chunks = None
 
         # load cache if exists
         if cache:
-            print('Loading TOC Tree Cache...')
-            self.toc_tree = [TocTreeNode.model_validate(cache_root_node) for cache_root_node in cache]
-            print('Loading TOC Tree Cache...OK')
+            self.instrumentation.emit('cache_load_start')
+            if isinstance(cache, CompactTocTree):
+                self._set_toc_tree(cache._build_tree(_TocNode))
+                for metric_name in ('toc_headers_count', 'coverage_metric', 'untitled_labels_count', 'link_gap_count'):
+                    if metric_name in cache.meta:
+                        setattr(self, metric_name, cache.meta[metric_name])
+                # parse timings and counters of the cached document, the instrumentation only counts this session
+                self._parse_timings = dict(cache.meta.get('timings', {}))
+                self._parse_counters = dict(cache.meta.get('counters', {}))
+                # decoded by update only
+                self._cached_update_state = bytes(cache.update_state)
+            elif lazy:
+                self._set_toc_tree([_TocNode.from_dict(cache_root_node) for cache_root_node in cache])
+            else:
+                self._set_toc_tree([_TocNode.from_model(TocTreeNode.model_validate(cache_root_node)) for cache_root_node in cache])
+            self.instrumentation.emit('cache_load_end')
             return
 
+        with self.instrumentation.timer('parse_total'):
+            self._parse()
+        self._end_parse_session()
+        if text_offsets:
+            self.index_text_offsets()
+
+    def _end_parse_session(self):
+        ''' Parse timings and counters are kept apart, later work is counted in a fresh session '''
+        self._parse_timings, self.instrumentation.timings = self.instrumentation.timings, {}
+        self._parse_counters, self.instrumentation.counters = self.instrumentation.counters, {}
+
+    def _parse(self):
+        instrumentation = self.instrumentation
+        # kept for update, the PDF may be overwritten before the next revision is parsed
+        with instrumentation.timer('page_hashes'):
+            self._page_hashes = self._get_page_hashes()
         # create toc tree
-        toc_links = self._extract_toc_links()
+        with instrumentation.timer('link_extraction'):
+            toc_links = self._extract_toc_links()
         idx_seq_gap = ZPDF._links_gap_check_by_idx([x.link_idx for x in toc_links])
         if idx_seq_gap:
-            print('Found Link Gaps', idx_seq_gap)
+            instrumentation.emit('link_gaps', link_gaps=idx_seq_gap)
             self.link_gap_count = len(idx_seq_gap)
         self.toc_headers_count = len(toc_links)
-        print('Found', self.toc_headers_count, 'TOC Headers')
-        inconsistent_links = [l for l in toc_links if not l.link_label.startswith(l.link_idx)]
-        if inconsistent_links:
-            print('Found Inconsistent Links', inconsistent_links)
-        print('Building TOC Tree...')
-        self.toc_tree = self._build_toc_tree(toc_links, 0, len(toc_links), 0)
-        print('Building TOC Tree...OK')
+        instrumentation.emit('toc_headers', toc_headers_count=self.toc_headers_count)
+        if instrumentation.enabled:
+            inconsistent_links = [l for l in toc_links if not l.link_label.startswith(l.link_idx)]
+            if inconsistent_links:
+                instrumentation.emit('inconsistent_links', links=[l.to_model() for l in inconsistent_links])
+        instrumentation.emit('tree_build_start')
+        with instrumentation.timer('tree_build'):
+            self._set_toc_tree(self._build_toc_tree(toc_links))
+        instrumentation.emit('tree_build_end')
 
         # generate toc coverage metric
-        print('Validating TOC Tree...')
-        coverage_metric, not_found_links = self._validate_toc_tree(toc_links)
+        instrumentation.emit('validation_start')
+        with instrumentation.timer('validation'):
+            coverage_metric, not_found_links = self._validate_toc_tree(toc_links)
         self.coverage_metric = coverage_metric
-        print('TOC Coverage Metric:', self.coverage_metric)
+        instrumentation.emit('coverage_metric', coverage_metric=self.coverage_metric)
 
         # post correction
         if len(not_found_links) == 0:
+            instrumentation.count('nodes_built', len(self._toc_index))
             return
 
-        print('Running Post Correction...')
-        missing_roots = {not_found_link.link_idx.split('.')[0] for not_found_link in not_found_links}
-        for root_key in missing_roots:
-            arr_idx, link = ZPDF._get_first_link_by_parent_key(root_key, toc_links)
-            toc_links.insert(arr_idx, TocLink(
-                link_idx=root_key,
-                link_label=self._try_find_untitled_header(root_key),
-                target_page=link.target_page,
-            ))
+        instrumentation.emit('post_correction_start')
+        with instrumentation.timer('post_correction'):
+            toc_links = self._post_correct(toc_links, not_found_links)
         self.toc_headers_count = len(toc_links)
-        print('Found', self.toc_headers_count, 'TOC Headers')
+        instrumentation.emit('toc_headers', toc_headers_count=self.toc_headers_count)
         toc_links = self._fill_next_link_page(toc_links)
-        self.toc_tree = self._build_toc_tree(toc_links, 0, len(toc_links), 0)
-        print('Running Post Correction...OK')
+        with instrumentation.timer('tree_build'):
+            self._set_toc_tree(self._build_toc_tree(toc_links))
+        instrumentation.emit('post_correction_end')
 
         # generate toc coverage metric
-        print('Validating TOC Tree...')
-        coverage_metric, not_found_links = self._validate_toc_tree(toc_links)
+        instrumentation.emit('validation_start')
+        with instrumentation.timer('validation'):
+            coverage_metric, not_found_links = self._validate_toc_tree(toc_links)
         self.coverage_metric = coverage_metric
-        print('TOC Coverage Metric:', self.coverage_metric)
+        instrumentation.emit('coverage_metric', coverage_metric=self.coverage_metric)
+        instrumentation.count('nodes_built', len(self._toc_index))
 
-    def get_toc_node_text(self, node: TocTreeNode) -> str | None:
-        if not node:
-            return None
+    @staticmethod
+    def _is_same_subtree(node: _TocNode, other_node: _TocNode) -> bool:
+        stack = [(node, other_node)]
+        while stack:
+            node, other_node = stack.pop()
+            if (node.link_idx, node.link_label, node.start_page, node.end_page, node.end_tag, len(node.children)) != \
+                    (other_node.link_idx, other_node.link_label, other_node.start_page, other_node.end_page, other_node.end_tag, len(other_node.children)):
+                return False
+            stack += zip(node.children, other_node.children)
+        return True
 
-        # terminal section case
-        if node.end_page == -1:
-            terminal_section_text = ''
-            for page in range(node.start_page, self.doc.page_count):
-                page_text: str = self.doc.load_page(page).get_text()
-                if page == node.start_page:
-                    page_text = page_text.replace('\n', '')
-                    terminal_section_text += page_text.split(f" {node.link_idx} ")[-1]
-                    terminal_section_text += '\n'
-                    continue
-                terminal_section_text += page_text
-            return terminal_section_text
+    def _get_page_hashes(self) -> list[str]:
+        return [hashlib.sha1(page.read_contents()).hexdigest()[:16] for page in self.doc]
 
-        # single page case
-        if node.start_page == node.end_page:
-            start_page_text: str = self.doc.load_page(node.start_page).get_text()
-            start_page_text = start_page_text.replace('\n', '')
-            start_marker = f" {node.link_idx} "
-            end_marker = f" {node.end_tag} "
-            matches = re.findall(rf'{start_marker}(.*){end_marker}', start_page_text)
-            if not matches:
-                return None
-            return matches[0]
-
-        out_text = ''
-        for page in range(node.start_page, node.end_page + 1):
-            page_text: str = self.doc.load_page(page).get_text()
-            if page == node.start_page:
-                page_text = page_text.replace('\n', '')
-                out_text += page_text.split(f" {node.link_idx} ")[-1]
-                out_text += '\n'
-                continue
-            if page == node.end_page:
-                page_text = page_text.replace('\n', '')
-                out_text += '\n'
-                out_text += page_text.split(f" {node.end_tag} ")[0]
+    def _get_node_page_hashes(self, node: _TocNode, page_hashes: list[str]) -> list[str]:
+        end_page = len(page_hashes) - 1 if node.end_page == -1 else node.end_page
+        return page_hashes[node.start_page:end_page + 1]
+
+    def update(self, file_path: str, compare_text: bool = True, stream: PdfStream | None = None) -> TocTreeDiff:
+        ''' Reparse a new revision of the PDF in place, stream is the in memory revision named file_path
+
+        the new revision is fully parsed, only the link texts of TOC pages whose content did not change are reused instead of extracted again
+        chapters whose subtree did not change keep their node objects
+        modified sections have a different label or page range, compare_text also marks sections whose page content changed
+        page hashes of the previous revision come from its parse or its compact cache, without them (list caches) every kept section is marked modified when comparing text
+        '''
+        self.instrumentation.emit('update', file_path=file_path)
+        old_toc_index = self._toc_index
+        if self._page_hashes is None:
+            self._page_hashes, self._toc_page_links = CompactTocTree.decode_update_state(self._cached_update_state)
+        old_page_hashes = self._page_hashes
+        old_roots = {}
+        for root_node in self._toc_tree:
+            old_roots.setdefault(root_node.link_idx, root_node)
+        had_text_offsets = any(node.start_char is not None for node in old_toc_index.values())
+
+        self.close()
+        self.file_path = file_path
+        self._set_source(file_path, stream)
+        # page text of the previous revision
+        self.text_store = None
+        self.instrumentation.timings = {}
+        self.instrumentation.counters = {}
+        with self.instrumentation.timer('open'):
+            self._doc = self._open_doc()
+        self._reusable_page_links = self._toc_page_links
+        self._toc_page_links = {}
+        self._cached_update_state = b''
+        self.toc_region = None
+        self.untitled_labels_count = 0
+        self.link_gap_count = 0
+        with self.instrumentation.timer('parse_total'):
+            self._parse()
+        self._end_parse_session()
+        reused_toc_pages = len(self._toc_page_links.keys() & self._reusable_page_links.keys())
+        self._reusable_page_links = {}
+
+        # splice unchanged chapters back into the new tree
+        toc_tree = []
+        for root_node in self._toc_tree:
+            old_root_node = old_roots.get(root_node.link_idx)
+            toc_tree.append(old_root_node if old_root_node and ZPDF._is_same_subtree(root_node, old_root_node) else root_node)
+        self._set_toc_tree(toc_tree)
+        if had_text_offsets:
+            for node in self._toc_index.values():
+                node.start_char, node.end_char = None, None
+            self.index_text_offsets()
+
+        new_page_hashes = self._page_hashes
+        modified = []
+        for toc_key, node in self._toc_index.items():
+            old_node = old_toc_index.get(toc_key)
+            if old_node is None:
                 continue
-            out_text += page_text
-        return out_text
+            if (node.link_label, node.start_page, node.end_page, node.end_tag) != (old_node.link_label, old_node.start_page, old_node.end_page, old_node.end_tag) or \
+                    (compare_text and (old_page_hashes is None or self._get_node_page_hashes(node, new_page_hashes) != self._get_node_page_hashes(old_node, old_page_hashes))):
+                modified.append(toc_key)
+        toc_tree_diff = TocTreeDiff(
+            added=[toc_key for toc_key in self._toc_index if toc_key not in old_toc_index],
+            removed=[toc_key for toc_key in old_toc_index if toc_key not in self._toc_index],
+            modified=modified,
+            reused_toc_pages=reused_toc_pages,
+            scanned_toc_pages=len(self._toc_page_links),
+        )
+        self.instrumentation.emit('toc_diff', added=toc_tree_diff.added, removed=toc_tree_diff.removed, modified=toc_tree_diff.modified)
+        return toc_tree_diff
 
-    def find_toc_tree_node(self, toc_key: str) -> TocTreeNode | None:
-        if not self.toc_tree:
-            return None
+    @classmethod
+    def open(cls, file_path: str, store=None, lazy: bool = True, **kwargs) -> 'ZPDF':
+        ''' Load the TOC tree from a cache store (see zpdf_store.ZPDFCache) if it holds a valid entry, otherwise parse the PDF and persist it '''
+        if store is None:
+            return cls(file_path, lazy=lazy, **kwargs)
+        link_classifier = kwargs.get('link_classifier') or LinkClassifier()
+        stream = kwargs.get('stream')
+        if stream is not None:
+            cache_key = compute_stream_cache_key(stream, link_classifier.short_link_threshold, link_classifier.allowed_header_chars)
+        else:
+            cache_key = store.get_cache_key(file_path, link_classifier.short_link_threshold, link_classifier.allowed_header_chars)
+        if kwargs.get('text_store') is None:
+            kwargs['text_store'] = store.load_text(cache_key)
+        compact_cache = store.load(cache_key)
+        if compact_cache:
+            return cls(file_path, cache=compact_cache, lazy=lazy, **kwargs)
+
+        # only one process parses a given document, others wait and load its cache
+        with store.entry_lock(cache_key):
+            compact_cache = store.load(cache_key)
+            if compact_cache:
+                return cls(file_path, cache=compact_cache, lazy=lazy, **kwargs)
+            zpdf = cls(file_path, lazy=lazy, **kwargs)
+            store.save(CompactTocTree.from_toc_tree(zpdf._toc_tree, cache_key=cache_key, meta=zpdf._get_parse_metrics(), update_state=zpdf._get_update_state()))
+        return zpdf
+
+    @classmethod
+    def from_stream(cls, stream: PdfStream, name: str = '<stream>', store=None, lazy: bool = True, **kwargs) -> 'ZPDF':
+        ''' Parse (or load from the cache store) a PDF held in memory, e.g. downloaded from object storage, without a temp file '''
+        return cls.open(name, store=store, lazy=lazy, stream=stream, **kwargs)
 
-        # perform dfs traversal
-        root_node_key = toc_key.split('.')[0]
-        stack = [root_node for root_node in self.toc_tree if root_node.link_idx == root_node_key]
-        if not stack:
+    @classmethod
+    def from_mmap(cls, file_path: str, store=None, lazy: bool = True, **kwargs) -> 'ZPDF':
+        ''' Parse a memory mapped PDF file, the mapping is shared with other processes mapping the same file '''
+        with open(file_path, 'rb') as f:
+            stream = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        zpdf = cls.open(file_path, store=store, lazy=lazy, stream=stream, **kwargs)
+        # page pool workers open the file on their own
+        zpdf.source_path = file_path
+        return zpdf
+
+    @classmethod
+    def from_store(cls, cache_key: str, store, name: str | None = None, **kwargs) -> 'ZPDF | None':
+        ''' Read only replica built from a cache store entry with a text store, the PDF is not needed for TOC queries and text extraction
+        returns None if the store does not hold both the TOC cache and the page text of cache_key
+        '''
+        compact_cache = store.load(cache_key)
+        text_store = store.load_text(cache_key)
+        if compact_cache is None or text_store is None:
             return None
+        return cls(name or cache_key, cache=compact_cache, lazy=True, text_store=text_store, **kwargs)
+
+    def _set_source(self, file_path: str, stream: PdfStream | None):
+        self._stream = memoryview(stream).cast('B') if stream is not None else None
+        self.source_path = file_path if stream is None else None
+
+    def _open_doc(self) -> fitz.Document:
+        if self._stream is not None:
+            return fitz.open(stream=self._stream, filetype='pdf')
+        return fitz.open(self.file_path)
+
+    @property
+    def doc(self) -> fitz.Document:
+        if self._doc is None:
+            self.instrumentation.emit('pdf_open', file_path=self.file_path)
+            with self.instrumentation.timer('open'):
+                self._doc = self._open_doc()
+        return self._doc
+
+    @property
+    def page_count(self) -> int:
+        ''' From the text store when there is one, so text extraction does not open the PDF '''
+        if self.text_store is not None:
+            return self.text_store.page_count
+        return self.doc.page_count
+
+    @property
+    def is_open(self) -> bool:
+        return self._doc is not None
+
+    def close(self):
+        ''' Release the PDF handle and cached page text, the TOC tree is kept and the PDF is reopened on demand '''
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+        self.page_cache.clear()
+
+    def __enter__(self) -> 'ZPDF':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _find_start_char(node: TocTreeNode | _TocNode, flat_page_text: str) -> int:
+        ''' Section text starts after the last start marker of its first page '''
+        start_marker = f" {node.link_idx} "
+        start_char = flat_page_text.rfind(start_marker)
+        return 0 if start_char == -1 else start_char + len(start_marker)
+
+    @staticmethod
+    def _find_end_char(node: TocTreeNode | _TocNode, flat_page_text: str) -> int:
+        ''' Section text ends before the first end marker of its last page '''
+        end_char = flat_page_text.find(f" {node.end_tag} ")
+        return len(flat_page_text) if end_char == -1 else end_char
+
+    @staticmethod
+    def _find_single_page_offsets(node: TocTreeNode | _TocNode, flat_page_text: str) -> tuple[int, int]:
+        ''' Text between the first start marker and the last end marker after it, (-1, -1) if there is no match '''
+        start_marker = f" {node.link_idx} "
+        start_char = flat_page_text.find(start_marker)
+        if start_char == -1:
+            return -1, -1
+        start_char += len(start_marker)
+        end_char = flat_page_text.rfind(f" {node.end_tag} ", start_char)
+        if end_char == -1:
+            return -1, -1
+        return start_char, end_char
+
+    def index_text_offsets(self):
+        ''' Record where every section starts and ends in its flattened boundary pages, extraction then slices instead of searching
+
+        terminal sections get end_char -1, single page sections without a match get (-1, -1)
+        '''
+        # visit boundary pages in order so each page is flattened once
+        boundaries: list[tuple[int, int, _TocNode]] = []
+        stack = list(self._toc_tree)
         while stack:
-            node = stack.pop(0)  # optimization that abuses the sorted toc_tree
-            if node.link_idx == toc_key:
-                return node
+            node = stack.pop()
             stack += node.children
+            if node.end_page != -1 and node.start_page == node.end_page:
+                boundaries.append((node.start_page, 0, node))
+                continue
+            boundaries.append((node.start_page, 1, node))
+            if node.end_page == -1:
+                node.end_char = -1
+            else:
+                boundaries.append((node.end_page, 2, node))
+
+        flat_page_number, flat_page_text = -1, ''
+        for page_number, boundary_kind, node in sorted(boundaries, key=lambda x: (x[0], x[1])):
+            if page_number != flat_page_number:
+                flat_page_number, flat_page_text = page_number, self._get_page_text(page_number).replace('\n', '')
+            if boundary_kind == 0:
+                node.start_char, node.end_char = ZPDF._find_single_page_offsets(node, flat_page_text)
+            elif boundary_kind == 1:
+                node.start_char = ZPDF._find_start_char(node, flat_page_text)
+            else:
+                node.end_char = ZPDF._find_end_char(node, flat_page_text)
+        # models built before hold the old offsets
+        for _, _, node in boundaries:
+            node._model = None
+
+    def _get_flat_page_text(self, page_number: int, flat_page_texts: dict[int, str] | None = None) -> str:
+        ''' Page text without line breaks, memoized in flat_page_texts when given '''
+        if flat_page_texts is None:
+            return self._get_page_text(page_number).replace('\n', '')
+        flat_page_text = flat_page_texts.get(page_number)
+        if flat_page_text is None:
+            flat_page_text = flat_page_texts[page_number] = self._get_page_text(page_number).replace('\n', '')
+        return flat_page_text
+
+    def _get_single_page_text(self, node: TocTreeNode | _TocNode, flat_page_texts: dict[int, str] | None = None) -> str | None:
+        start_page_text = self._get_flat_page_text(node.start_page, flat_page_texts)
+        if node.start_char is not None:
+            start_char, end_char = node.start_char, node.end_char
+        else:
+            start_char, end_char = ZPDF._find_single_page_offsets(node, start_page_text)
+        if start_char == -1:
+            return None
+        return start_page_text[start_char:end_char]
+
+    def _iter_toc_node_text(self, node: TocTreeNode | _TocNode, flat_page_texts: dict[int, str] | None = None) -> Iterator[str]:
+        if not node:
+            return
+
+        # single page case
+        if node.end_page != -1 and node.start_page == node.end_page:
+            single_page_text = self._get_single_page_text(node, flat_page_texts)
+            if single_page_text is not None:
+                yield single_page_text
+            return
+
+        # terminal section case runs until the end of the document, its last page is not trimmed
+        end_page = self.page_count - 1 if node.end_page == -1 else node.end_page
+        if end_page < node.start_page:
+            return
+        flat_page_text = self._get_flat_page_text(node.start_page, flat_page_texts)
+        start_char = node.start_char if node.start_char is not None else ZPDF._find_start_char(node, flat_page_text)
+        yield flat_page_text[start_char:] + '\n'
+        yield from self._iter_pages_text(range(node.start_page + 1, end_page + 1 if node.end_page == -1 else end_page))
+        if node.end_page != -1:
+            flat_page_text = self._get_flat_page_text(end_page, flat_page_texts)
+            end_char = node.end_char if node.end_char is not None else ZPDF._find_end_char(node, flat_page_text)
+            yield '\n' + flat_page_text[:end_char]
+
+    def _iter_pages_text(self, page_numbers: range) -> Iterator[str]:
+        ''' Inner section pages, long ranges are split in chunks over the page pool and yielded in order '''
+        # in memory PDFs can not be reopened by the workers, stored pages are cheaper to decompress than to send
+        if self.page_pool is None or self.source_path is None or self.text_store is not None or len(page_numbers) < self.parallel_min_pages:
+            for page_number in page_numbers:
+                yield self._get_page_text(page_number)
+            return
+
+        self.instrumentation.count('pages_pooled', len(page_numbers))
+        for pages_text in self._iter_pooled_chunks(self.page_pool, _get_pages_text, page_numbers):
+            yield from pages_text
+
+    def _iter_pooled_chunks(self, page_pool: Executor, get_chunk: Callable, page_numbers: range) -> Iterator[list]:
+        ''' Chunk results in page order, at most parallel_max_chunks chunks (twice page_pool_workers by default) are in flight
+
+        the next chunk is submitted as each one is yielded, so a slow consumer never buffers the whole range
+        '''
+        max_chunks = self.parallel_max_chunks or 2 * (self.page_pool_workers or os.cpu_count() or 1)
+        chunks = (page_numbers[i:i + self.parallel_chunk_pages] for i in range(0, len(page_numbers), self.parallel_chunk_pages))
+        futures = deque()
+        try:
+            for chunk in chunks:
+                futures.append(page_pool.submit(get_chunk, self.source_path, chunk))
+                if len(futures) >= max_chunks:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            # consumer stopped early
+            for future in futures:
+                future.cancel()
+
+    def iter_toc_node_text(self, node: TocTreeNode | _TocNode) -> Iterator[str]:
+        ''' Yields section text page by page, only the boundary pages are flattened and trimmed '''
+        return self._iter_toc_node_text(node)
+
+    def _get_toc_node_text(self, node: TocTreeNode | _TocNode, flat_page_texts: dict[int, str] | None = None) -> str | None:
+        if not node:
+            return None
+        if node.end_page != -1 and node.start_page == node.end_page:
+            return self._get_single_page_text(node, flat_page_texts)
+        return ''.join(self._iter_toc_node_text(node, flat_page_texts))
+
+    def get_toc_node_text(self, node: TocTreeNode | _TocNode) -> str | None:
+        return self._get_toc_node_text(node)
+
+    @staticmethod
+    def _to_model(node: _TocNode | None) -> TocTreeNode | None:
+        return node.to_model() if node else None
+
+    def find_toc_tree_node(self, toc_key: str) -> TocTreeNode | None:
+        return ZPDF._to_model(self._toc_index.get(toc_key))
+
+    def find_toc_tree_nodes(self, toc_keys: list[str]) -> list[TocTreeNode | None]:
+        ''' Bulk version of find_toc_tree_node, output is aligned with the input keys '''
+        return [ZPDF._to_model(self._toc_index.get(toc_key)) for toc_key in toc_keys]
+
+    def find_toc_parent_node(self, toc_key: str) -> TocTreeNode | None:
+        return ZPDF._to_model(self._toc_parents.get(toc_key))
+
+    def find_toc_sibling_nodes(self, toc_key: str) -> tuple[TocTreeNode | None, TocTreeNode | None]:
+        ''' Returns (previous, next) siblings of a toc tree node '''
+        prev_node, next_node = self._toc_siblings.get(toc_key, (None, None))
+        return ZPDF._to_model(prev_node), ZPDF._to_model(next_node)
 
     def get_cache(self) -> list[dict]:
-        return [root_node.model_dump() for root_node in self.toc_tree]
+        return [root_node.to_dict() for root_node in self._toc_tree]
+
+    def get_cache_key(self) -> str:
+        if self._stream is not None:
+            return compute_stream_cache_key(self._stream, self.short_link_threshold, self.allowed_header_chars)
+        return compute_cache_key(self.file_path, self.short_link_threshold, self.allowed_header_chars)
+
+    def get_compact_cache(self) -> CompactTocTree:
+        ''' Binary cache keyed by the PDF content and parser settings, document metrics are kept in the cache meta '''
+        return CompactTocTree.from_toc_tree(self._toc_tree, cache_key=self.get_cache_key(), meta=self._get_parse_metrics(), update_state=self._get_update_state())
+
+    def get_text_store(self, page_pool: Executor | None = None) -> PageTextStore:
+        ''' Compressed text of every page keyed like the compact cache, built in chunks over the page pool when the PDF is a file '''
+        page_pool = page_pool or self.page_pool
+        page_numbers = range(self.doc.page_count)
+        if page_pool is None or self.source_path is None:
+            compressed_pages = [PageTextStore.compress(self.doc.load_page(page_number).get_text()) for page_number in page_numbers]
+        else:
+            compressed_pages = [
+                compressed_page
+                for compressed_pages_chunk in self._iter_pooled_chunks(page_pool, _get_compressed_pages_text, page_numbers)
+                for compressed_page in compressed_pages_chunk
+            ]
+        return PageTextStore.from_pages(compressed_pages, cache_key=self.get_cache_key())
 
-    def get_toc_tree(self):
+    def _get_update_state(self) -> bytes:
+        ''' Encoded page hashes and TOC page links used by update, documents loaded from cache pass theirs through '''
+        if self._page_hashes is None:
+            return self._cached_update_state
+        return CompactTocTree.encode_update_state(self._page_hashes, self._toc_page_links)
+
+    @property
+    def toc_tree(self) -> list[TocTreeNode]:
+        ''' Pydantic models of the whole tree, built on demand '''
+        return [root_node.to_model() for root_node in self._toc_tree]
+
+    def get_toc_tree(self) -> list[TocTreeNode]:
         return self.toc_tree
 
-    def get_benchmark(self) -> dict:
+    def get_page_cache_stats(self) -> dict:
+        return self.page_cache.get_stats()
+
+    def _get_parse_metrics(self) -> dict:
+        ''' Document metrics plus the phase timings (seconds) and counters of the parse that built the tree, kept in the cache meta '''
         return {
             'toc_headers_count': self.toc_headers_count,
             'coverage_metric': self.coverage_metric,
             'untitled_labels_count': self.untitled_labels_count,
             'link_gap_count': self.link_gap_count,
+            'timings': dict(self._parse_timings),
+            'counters': dict(self._parse_counters),
+        }
+
+    def get_benchmark(self) -> dict:
+        ''' Parse metrics, cached documents report their original parse, plus the timings and counters of this session (lazy open, page loads, text extraction) '''
+        return {
+            **self._get_parse_metrics(),
+            'session_timings': dict(self.instrumentation.timings),
+            'session_counters': dict(self.instrumentation.counters),
         }
 
     def extract_text(self, toc_keys: list[str]) -> list[str]:
-        filtered_keys = ZPDF._remove_key_overlaps(toc_keys)
-        toc_tree_nodes = [self.find_toc_tree_node(key) for key in filtered_keys]
-        return [self.get_toc_node_text(node) for node in toc_tree_nodes]
+        ''' Text of the non overlapping keys in sorted key order, None for unknown keys
+
+        sections are extracted in page order so boundary pages shared by neighbouring sections are read and flattened once
+        '''
+        return self._get_toc_nodes_text([self._toc_index.get(key) for key in self._filter_key_overlaps(toc_keys)])
+
+    def get_toc_nodes_text(self, toc_keys: list[str]) -> list[str | None]:
+        ''' Bulk version of get_toc_node_text, keys may overlap and the output is aligned with the input keys '''
+        return self._get_toc_nodes_text([self._toc_index.get(key) for key in toc_keys])
+
+    def _get_toc_nodes_text(self, toc_tree_nodes: list[_TocNode | None]) -> list[str | None]:
+        sections = [None] * len(toc_tree_nodes)
+        flat_page_texts = {}
+        for node_number in sorted([i for i, node in enumerate(toc_tree_nodes) if node], key=lambda i: toc_tree_nodes[i].start_page):
+            node = toc_tree_nodes[node_number]
+            # pages before this section are not boundary pages of the next ones
+            for page_number in [page_number for page_number in flat_page_texts if page_number < node.start_page]:
+                del flat_page_texts[page_number]
+            sections[node_number] = self._get_toc_node_text(node, flat_page_texts)
+        return sections
+
+    def iter_extract_text(self, toc_keys: list[str]) -> Iterator[tuple[str, Iterator[str] | None]]:
+        ''' Streaming version of extract_text, yields (toc_key, page chunks) per non overlapping key, chunks are None for unknown keys '''
+        for key in self._filter_key_overlaps(toc_keys):
+            node = self._toc_index.get(key)
+            yield key, (self.iter_toc_node_text(node) if node else None)
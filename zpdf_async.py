@@ -0,0 +1,86 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Hashable
+from zpdf import ZPDF, TocTreeNode
+
+_default_executor: ThreadPoolExecutor | None = None
+
+
+def _get_default_executor() -> ThreadPoolExecutor:
+    ''' Bounded executor shared by all AsyncZPDF objects that are not given their own executor '''
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4), thread_name_prefix='zpdf')
+    return _default_executor
+
+
+class AsyncZPDF:
+    ''' Asyncio facade over ZPDF
+
+    blocking MuPDF work runs in an executor, a document is accessed by one worker at a time
+    (fitz documents, the page cache and the instrumentation counters are not thread safe)
+    and concurrent requests for the same sections or page share a single execution
+    '''
+    zpdf: ZPDF
+    _executor: Executor
+    _doc_lock: asyncio.Lock
+    _inflight: dict[Hashable, asyncio.Future]
+
+    def __init__(self, zpdf: ZPDF, executor: Executor | None = None):
+        self.zpdf = zpdf
+        self._executor = executor or _get_default_executor()
+        self._doc_lock = asyncio.Lock()
+        self._inflight = {}
+
+    @classmethod
+    async def create(cls, file_path: str, executor: Executor | None = None, **zpdf_kwargs) -> 'AsyncZPDF':
+        ''' Parse or load (see ZPDF.open for store and cache arguments) a document without blocking the event loop '''
+        executor = executor or _get_default_executor()
+        zpdf = await asyncio.get_running_loop().run_in_executor(executor, functools.partial(ZPDF.open, file_path, **zpdf_kwargs))
+        return cls(zpdf, executor)
+
+    async def _run(self, func: Callable, *args):
+        async with self._doc_lock:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def _single_flight(self, key: Hashable, func: Callable, *args):
+        ''' Concurrent calls with the same key await the same execution '''
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(func, *args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield keeps a cancelled caller from cancelling the shared execution
+        return await asyncio.shield(future)
+
+    def find_toc_tree_node(self, toc_key: str) -> TocTreeNode | None:
+        return self.zpdf.find_toc_tree_node(toc_key)
+
+    def find_toc_tree_nodes(self, toc_keys: list[str]) -> list[TocTreeNode | None]:
+        return self.zpdf.find_toc_tree_nodes(toc_keys)
+
+    async def get_page_text(self, page_number: int) -> str:
+        return await self._single_flight(('page', page_number), self.zpdf._get_page_text, page_number)
+
+    async def get_toc_node_text(self, node: TocTreeNode) -> str | None:
+        if not node:
+            return None
+        return await self._single_flight(('node', node.link_idx, node.start_page, node.end_page), self.zpdf.get_toc_node_text, node)
+
+    async def extract_text(self, toc_keys: list[str]) -> list[str]:
+        ''' One executor call for the whole key list, so sections are extracted in page order and shared boundary pages are flattened once '''
+        return await self._single_flight(('extract', tuple(toc_keys)), self.zpdf.extract_text, list(toc_keys))
+
+    async def iter_toc_node_text(self, node: TocTreeNode) -> AsyncIterator[str]:
+        ''' Async streaming version of ZPDF.iter_toc_node_text, each page chunk is produced in the executor '''
+        chunks = self.zpdf.iter_toc_node_text(node)
+        while True:
+            chunk = await self._run(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def close(self):
+        await self._run(self.zpdf.close)
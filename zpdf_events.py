@@ -0,0 +1,85 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class EventSink:
+    ''' Receives structured ZPDF events, subclass and override emit '''
+
+    def emit(self, event: str, fields: dict):
+        pass
+
+
+class PrintSink(EventSink):
+    ''' Prints events in the original ZPDF log format '''
+    _formats = {
+        'init': lambda fields: ('Initializing ZPDF for file:', fields['file_path']),
+        'pdf_open': lambda fields: ('Opening PDF file:', fields['file_path']),
+        'update': lambda fields: ('Updating ZPDF to file:', fields['file_path']),
+        'cache_load_start': lambda fields: ('Loading TOC Tree Cache...',),
+        'cache_load_end': lambda fields: ('Loading TOC Tree Cache...OK',),
+        'duplicate_link': lambda fields: (fields['link_idx'], 'Duplicate'),
+        'link_gaps': lambda fields: ('Found Link Gaps', fields['link_gaps']),
+        'toc_headers': lambda fields: ('Found', fields['toc_headers_count'], 'TOC Headers'),
+        'inconsistent_links': lambda fields: ('Found Inconsistent Links', fields['links']),
+        'tree_build_start': lambda fields: ('Building TOC Tree...',),
+        'tree_build_end': lambda fields: ('Building TOC Tree...OK',),
+        'invalid_node': lambda fields: (fields['link_idx'], 'Invalid'),
+        'validation_start': lambda fields: ('Validating TOC Tree...',),
+        'link_not_found': lambda fields: (fields['link_idx'], 'not Found'),
+        'link_mismatch': lambda fields: (fields['link_idx'], 'Mismatch'),
+        'coverage_metric': lambda fields: ('TOC Coverage Metric:', fields['coverage_metric']),
+        'post_correction_start': lambda fields: ('Running Post Correction...',),
+        'post_correction_end': lambda fields: ('Running Post Correction...OK',),
+        'untitled_header': lambda fields: ('Can not Find Unlinked Index', fields['link_idx']),
+        'toc_diff': lambda fields: ('Changed TOC Sections', len(fields['added']), 'added', len(fields['removed']), 'removed', len(fields['modified']), 'modified'),
+    }
+
+    def emit(self, event: str, fields: dict):
+        event_format = PrintSink._formats.get(event)
+        if event_format:
+            print(*event_format(fields))
+
+
+class ListSink(EventSink):
+    ''' Keeps (event, fields) tuples in memory, useful for tests and batch reports '''
+    events: list[tuple[str, dict]]
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event: str, fields: dict):
+        self.events.append((event, fields))
+
+
+class Instrumentation:
+    ''' Per document events, phase timers and counters
+
+    events are only built when a sink is set (check enabled before building expensive fields), timers and counters are always kept for get_benchmark
+    '''
+    sink: EventSink | None
+    enabled: bool
+    timings: dict[str, float]
+    counters: dict[str, int]
+
+    def __init__(self, sink: EventSink | None = None):
+        self.sink = sink
+        self.enabled = sink is not None
+        self.timings = {}
+        self.counters = {}
+
+    def emit(self, event: str, **fields):
+        if self.sink is not None:
+            self.sink.emit(event, fields)
+
+    def count(self, counter: str, value: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        ''' Accumulates the wall time of a phase, phases that run several times add up '''
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start_time
@@ -0,0 +1,145 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import contextlib
+import multiprocessing
+from glob import glob
+from typing import Iterator
+from multiprocessing.connection import Connection, wait
+from pydantic import BaseModel
+from zpdf import ZPDF
+from zpdf_store import ZPDFCache
+
+
+class IngestResult(BaseModel):
+    file_path: str
+    success: bool
+    benchmark: dict | None = None
+    error: str | None = None
+    elapsed: float = 0.0
+
+
+def json_cache_path(json_cache_dir: str, file_path: str) -> str:
+    ''' cache/sample_rxi_1_cache.json for data/sample_rxi_1.pdf '''
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(json_cache_dir, f"{file_name}_cache.json")
+
+
+def ingest_file(file_path: str, cache_dir: str | None = None, json_cache_dir: str | None = None, refresh: bool = False, use_mmap: bool = False, text_store: bool = False) -> dict:
+    ''' Parse a single PDF, persist its caches and return its benchmark, use_mmap reads the file through a shared memory mapping
+    text_store also persists the compressed page text next to the TOC cache, for replicas without the PDFs (see ZPDF.from_store)
+    '''
+    if cache_dir and not refresh:
+        zpdf = ZPDF.from_mmap(file_path, store=ZPDFCache(cache_dir)) if use_mmap else ZPDF.open(file_path, store=ZPDFCache(cache_dir))
+    else:
+        zpdf = ZPDF.from_mmap(file_path, lazy=False) if use_mmap else ZPDF(file_path=file_path)
+        if cache_dir:
+            ZPDFCache(cache_dir).save(zpdf.get_compact_cache())
+    if text_store and cache_dir and (refresh or zpdf.text_store is None):
+        ZPDFCache(cache_dir).save_text(zpdf.get_text_store())
+    if json_cache_dir:
+        with open(json_cache_path(json_cache_dir, file_path), 'w') as f:
+            f.write(json.dumps(zpdf.get_cache(), indent=2))
+    benchmark = zpdf.get_benchmark()
+    zpdf.close()
+    return benchmark
+
+
+def _ingest_worker(conn: Connection, file_path: str, cache_dir: str | None, json_cache_dir: str | None, refresh: bool, verbose: bool, use_mmap: bool, text_store: bool):
+    start_time = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            benchmark = ingest_file(file_path, cache_dir, json_cache_dir, refresh, use_mmap, text_store)
+        result = IngestResult(file_path=file_path, success=True, benchmark=benchmark)
+    except Exception:
+        result = IngestResult(file_path=file_path, success=False, error=traceback.format_exc())
+    result.elapsed = time.perf_counter() - start_time
+    conn.send(result.model_dump())
+    conn.close()
+
+
+def ingest(
+    file_paths: list[str],
+    workers: int | None = None,
+    timeout: float | None = None,
+    cache_dir: str | None = None,
+    json_cache_dir: str | None = None,
+    refresh: bool = False,
+    verbose: bool = False,
+    use_mmap: bool = False,
+    text_store: bool = False,
+) -> Iterator[IngestResult]:
+    ''' Parse PDFs in a pool of worker processes, results are yielded as soon as each file completes
+
+    every file runs in its own process, so a timeout or a crash in MuPDF only fails that file
+    '''
+    workers = workers or os.cpu_count() or 1
+    pending = list(reversed(file_paths))
+    running: dict[Connection, tuple[multiprocessing.Process, str, float]] = {}
+    ctx = multiprocessing.get_context()
+    while pending or running:
+        while pending and len(running) < workers:
+            file_path = pending.pop()
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_ingest_worker, args=(child_conn, file_path, cache_dir, json_cache_dir, refresh, verbose, use_mmap, text_store), daemon=True)
+            process.start()
+            child_conn.close()
+            running[parent_conn] = (process, file_path, time.perf_counter())
+
+        wait_timeout = None
+        if timeout is not None:
+            now = time.perf_counter()
+            wait_timeout = max(0, min(start_time + timeout - now for _, _, start_time in running.values()))
+        for conn in wait(list(running.keys()), timeout=wait_timeout):
+            process, file_path, start_time = running.pop(conn)
+            try:
+                result = IngestResult.model_validate(conn.recv())
+            except EOFError:
+                process.join()
+                result = IngestResult(file_path=file_path, success=False, error=f"worker exited with code {process.exitcode}", elapsed=time.perf_counter() - start_time)
+            conn.close()
+            process.join()
+            yield result
+
+        if timeout is None:
+            continue
+        now = time.perf_counter()
+        for conn, (process, file_path, start_time) in list(running.items()):
+            if now - start_time < timeout:
+                continue
+            process.terminate()
+            process.join()
+            conn.close()
+            del running[conn]
+            yield IngestResult(file_path=file_path, success=False, error=f"timeout after {timeout} seconds", elapsed=now - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse PDFs in parallel and persist their TOC caches')
+    parser.add_argument('file_paths', nargs='+', help='PDF files or glob patterns')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, defaults to the cpu count')
+    parser.add_argument('--timeout', type=float, default=None, help='per file timeout in seconds')
+    parser.add_argument('--cache-dir', default=None, help='ZPDFCache store directory')
+    parser.add_argument('--json-cache-dir', default=None, help='also export JSON caches to this directory')
+    parser.add_argument('--refresh', action='store_true', help='reparse files that already have a valid cache')
+    parser.add_argument('--verbose', action='store_true', help='show parser output')
+    parser.add_argument('--text-store', action='store_true', help='also persist the compressed page text of every file in the cache store')
+    parser.add_argument('--mmap', action='store_true', help='read PDFs through shared memory mappings instead of file handles')
+    args = parser.parse_args()
+
+    file_paths = [file_path for pattern in args.file_paths for file_path in (glob(pattern) or [pattern])]
+    failed_count = 0
+    for result in ingest(file_paths, args.workers, args.timeout, args.cache_dir, args.json_cache_dir, args.refresh, args.verbose, args.mmap, args.text_store):
+        failed_count += not result.success
+        print(result.model_dump_json(), flush=True)
+    print('Ingested Files:', len(file_paths), file=sys.stderr)
+    print('Failed Files:', failed_count, file=sys.stderr)
+    sys.exit(1 if failed_count else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+from zpdf import ZPDF, CompactTocTree
+from zpdf_store import ZPDFCache
+
+
+class ZPDFPool:
+    ''' Registry of ZPDF documents by file id with a global budget on open PDF handles and resident page text
+
+    TOC trees stay resident, least recently used documents are closed when the budget is exceeded and reopened on their next access
+    threads sharing the pool use lease, leased documents are never closed under their holder
+    '''
+    max_open: int
+    max_bytes: int
+    store: ZPDFCache | None
+    hits: int
+    misses: int
+    evictions: int
+    reopens: int
+    _file_paths: dict[str, str]
+    _caches: dict[str, list[dict] | CompactTocTree | None]
+    _docs: OrderedDict[str, ZPDF]
+    _evicted: set[str]
+    _leases: dict[ZPDF, int]
+    _doc_locks: dict[ZPDF, threading.Lock]
+    _close_on_release: set[ZPDF]
+    _lock: threading.RLock
+
+    def __init__(self, max_open: int = 64, max_bytes: int = 0, store: ZPDFCache | None = None):
+        ''' max_bytes bounds PDF file sizes plus cached page text of open documents, 0 disables it '''
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reopens = 0
+        self._file_paths = {}
+        self._caches = {}
+        self._docs = OrderedDict()
+        self._evicted = set()
+        self._leases = {}
+        self._doc_locks = {}
+        self._close_on_release = set()
+        self._lock = threading.RLock()
+
+    def register(self, file_id: str, file_path: str, cache: list[dict] | CompactTocTree | None = None):
+        ''' Documents are loaded on their first access, from cache, the pool store or by parsing the PDF '''
+        with self._lock:
+            self.unregister(file_id)
+            self._file_paths[file_id] = file_path
+            self._caches[file_id] = cache
+
+    def unregister(self, file_id: str):
+        with self._lock:
+            zpdf = self._docs.pop(file_id, None)
+            if zpdf:
+                self._close_document(zpdf)
+            self._file_paths.pop(file_id, None)
+            self._caches.pop(file_id, None)
+            self._evicted.discard(file_id)
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self._file_paths
+
+    def __len__(self) -> int:
+        return len(self._file_paths)
+
+    @staticmethod
+    def _resident_bytes(zpdf: ZPDF) -> int:
+        if not zpdf.is_open:
+            return zpdf.page_cache.get_stats()['size_bytes']
+        return os.path.getsize(zpdf.file_path) + zpdf.page_cache.get_stats()['size_bytes']
+
+    def _close_document(self, zpdf: ZPDF):
+        ''' Dropped documents are closed right away, or when their last lease ends '''
+        if zpdf in self._leases:
+            self._close_on_release.add(zpdf)
+            return
+        self._doc_locks.pop(zpdf, None)
+        zpdf.close()
+
+    def get(self, file_id: str) -> ZPDF:
+        ''' The returned document counts as open, its PDF is reopened transparently by ZPDF on text access
+        another thread's get can close it again, use lease when the pool is shared between threads
+        '''
+        with self._lock:
+            zpdf = self._load(file_id)
+            self._enforce_budget(file_id)
+            return zpdf
+
+    @contextmanager
+    def lease(self, file_id: str) -> Iterator[ZPDF]:
+        ''' Exclusive use of a document for the duration of the block
+
+        leased documents are skipped by the budget, so the pool may stay over max_open until the leases end
+        threads leasing the same document wait for each other, a ZPDF and its PDF handle are not thread safe
+        '''
+        with self._lock:
+            zpdf = self._load(file_id)
+            self._leases[zpdf] = self._leases.get(zpdf, 0) + 1
+            doc_lock = self._doc_locks.setdefault(zpdf, threading.Lock())
+            self._enforce_budget(file_id)
+        try:
+            with doc_lock:
+                yield zpdf
+        finally:
+            with self._lock:
+                self._leases[zpdf] -= 1
+                if not self._leases[zpdf]:
+                    del self._leases[zpdf]
+                    if zpdf in self._close_on_release:
+                        self._close_on_release.discard(zpdf)
+                        self._close_document(zpdf)
+                    else:
+                        self._enforce_budget(None)
+
+    def _load(self, file_id: str) -> ZPDF:
+        ''' Caller holds the pool lock '''
+        zpdf = self._docs.get(file_id)
+        if zpdf is None:
+            self.misses += 1
+            cache = self._caches.pop(file_id, None)
+            if cache:
+                zpdf = ZPDF(self._file_paths[file_id], cache=cache, lazy=True)
+            else:
+                zpdf = ZPDF.open(self._file_paths[file_id], store=self.store)
+            self._docs[file_id] = zpdf
+        elif zpdf.is_open:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if file_id in self._evicted:
+                self.reopens += 1
+                self._evicted.discard(file_id)
+        self._docs.move_to_end(file_id)
+        return zpdf
+
+    def _enforce_budget(self, active_file_id: str | None):
+        ''' Caller holds the pool lock, the active and the leased documents are never closed '''
+        open_ids = [file_id for file_id, zpdf in self._docs.items() if zpdf.is_open or file_id == active_file_id]
+        resident_bytes = sum(ZPDFPool._resident_bytes(zpdf) for zpdf in self._docs.values())
+        for file_id in list(open_ids):
+            if file_id == active_file_id or self._docs[file_id] in self._leases:
+                continue
+            if len(open_ids) <= self.max_open and (not self.max_bytes or resident_bytes <= self.max_bytes):
+                break
+            zpdf = self._docs[file_id]
+            resident_bytes -= ZPDFPool._resident_bytes(zpdf)
+            zpdf.close()
+            open_ids.remove(file_id)
+            self._evicted.add(file_id)
+            self.evictions += 1
+
+    def close(self):
+        ''' Leased documents are closed when their lease ends '''
+        with self._lock:
+            for zpdf in self._docs.values():
+                self._close_document(zpdf)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'documents': len(self._file_paths),
+                'loaded': len(self._docs),
+                'open': sum(1 for zpdf in self._docs.values() if zpdf.is_open),
+                'resident_bytes': sum(ZPDFPool._resident_bytes(zpdf) for zpdf in self._docs.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'reopens': self.reopens,
+            }
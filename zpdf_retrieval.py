@@ -0,0 +1,277 @@
+import os
+import json
+import math
+import zlib
+import numpy as np
+from collections import Counter
+from pydantic import BaseModel
+from zpdf import ZPDF, TocTreeNode
+from zpdf_search import tokenize, get_own_text_node
+
+DEFAULT_CHUNK_WORDS = 256
+DEFAULT_CHUNK_OVERLAP = 32
+
+
+class HashingEmbedder:
+    ''' Stateless signed feature hashing of words and word bigrams, no fitting and no network needed '''
+    name = 'hashing'
+
+    dim: int
+    bigrams: bool
+
+    def __init__(self, dim: int = 1024, bigrams: bool = True):
+        self.dim = dim
+        self.bigrams = bigrams
+
+    def get_config(self) -> dict:
+        return {'name': HashingEmbedder.name, 'dim': self.dim, 'bigrams': self.bigrams}
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'HashingEmbedder':
+        return cls(dim=config['dim'], bigrams=config['bigrams'])
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])] if self.bigrams else tokens
+            for feature in features:
+                feature_hash = zlib.crc32(feature.encode())
+                rows.append(row)
+                cols.append(feature_hash % self.dim)
+                signs.append(-1.0 if feature_hash & 0x80000000 else 1.0)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (rows, cols), signs)
+        return _normalize(vectors)
+
+
+class TfidfEmbedder:
+    ''' TF-IDF over the most frequent words of the fitted chunks '''
+    name = 'tfidf'
+
+    max_features: int
+    vocabulary: dict[str, int]
+    idf: np.ndarray | None
+
+    def __init__(self, max_features: int = 4096):
+        self.max_features = max_features
+        self.vocabulary = {}
+        self.idf = None
+
+    @property
+    def dim(self) -> int:
+        return len(self.vocabulary)
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.idf is not None
+
+    def get_config(self) -> dict:
+        return {'name': TfidfEmbedder.name, 'max_features': self.max_features, 'vocabulary': list(self.vocabulary), 'idf': self.idf.tolist() if self.is_fitted else None}
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'TfidfEmbedder':
+        embedder = cls(max_features=config['max_features'])
+        embedder.vocabulary = {term: i for i, term in enumerate(config['vocabulary'])}
+        embedder.idf = np.array(config['idf'], dtype=np.float32) if config['idf'] is not None else None
+        return embedder
+
+    def fit(self, texts: list[str]):
+        document_frequencies = Counter()
+        for text in texts:
+            document_frequencies.update(set(tokenize(text)))
+        terms = [term for term, _ in document_frequencies.most_common(self.max_features)]
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.idf = np.array([math.log((1 + len(texts)) / (1 + document_frequencies[term])) + 1 for term in terms], dtype=np.float32)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if not self.is_fitted:
+            raise ValueError('TfidfEmbedder must be fitted before embedding')
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                col = self.vocabulary.get(token)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (rows, cols), 1.0)
+        return _normalize(vectors * self.idf)
+
+
+EMBEDDERS = {HashingEmbedder.name: HashingEmbedder, TfidfEmbedder.name: TfidfEmbedder}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def chunk_section_text(zpdf: ZPDF, node: TocTreeNode, chunk_words: int = DEFAULT_CHUNK_WORDS, overlap: int = DEFAULT_CHUNK_OVERLAP) -> list[tuple[str, int, int]]:
+    ''' Splits the section own text into overlapping word windows, returns (text, start_page, end_page) per chunk '''
+    own_text_node = get_own_text_node(node)
+    words = node.link_label.split()
+    word_pages = [node.start_page] * len(words)
+    # iter_toc_node_text yields one chunk per page starting from start_page
+    for page, page_text in enumerate(zpdf.iter_toc_node_text(own_text_node), start=node.start_page):
+        page_words = page_text.split()
+        words += page_words
+        word_pages += [page] * len(page_words)
+    chunks = []
+    step = max(chunk_words - overlap, 1)
+    for start in range(0, max(len(words) - overlap, 1), step):
+        end = min(start + chunk_words, len(words))
+        if start < end:
+            chunks.append((' '.join(words[start:end]), word_pages[start], word_pages[end - 1]))
+    return chunks or [(node.link_label, node.start_page, node.start_page)]
+
+
+class VectorHit(BaseModel):
+    doc_id: str
+    link_idx: str
+    start_page: int
+    end_page: int
+    score: float
+
+
+class SectionVectorIndex:
+    ''' Local embedding retrieval over TOC sections
+
+    chunk vectors are rows of a float32 matrix, chunks of a section are contiguous so scores reduce per section with a single numpy call
+    '''
+    embedder: HashingEmbedder | TfidfEmbedder
+    chunk_words: int
+    overlap: int
+    _matrix: np.ndarray
+    _pending: list[np.ndarray]
+    _section_keys: list[tuple[str, str]]
+    _section_starts: list[int]
+    _chunk_pages: list[tuple[int, int]]
+
+    def __init__(self, embedder: HashingEmbedder | TfidfEmbedder | None = None, chunk_words: int = DEFAULT_CHUNK_WORDS, overlap: int = DEFAULT_CHUNK_OVERLAP):
+        self.embedder = embedder or HashingEmbedder()
+        self.chunk_words = chunk_words
+        self.overlap = overlap
+        self._matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._pending = []
+        self._section_keys = []
+        self._section_starts = []
+        self._chunk_pages = []
+
+    def __len__(self) -> int:
+        return len(self._section_keys)
+
+    def _get_matrix(self) -> np.ndarray:
+        if self._pending:
+            self._matrix = np.concatenate([self._matrix] + self._pending)
+            self._pending = []
+        return self._matrix
+
+    def _collect_chunks(self, zpdf: ZPDF) -> list[tuple[str, list[tuple[str, int, int]]]]:
+        sections = []
+        stack = list(reversed(zpdf.get_toc_tree()))
+        while stack:
+            node = stack.pop()
+            stack += reversed(node.children)
+            sections.append((node.link_idx, chunk_section_text(zpdf, node, self.chunk_words, self.overlap)))
+        return sections
+
+    def add_documents(self, documents: dict[str, ZPDF]):
+        ''' Chunks and embeds documents in one batch, an unfitted TF-IDF embedder is fitted on these chunks '''
+        for doc_id in documents:
+            self.remove_document(doc_id)
+        document_sections = [(doc_id, self._collect_chunks(zpdf)) for doc_id, zpdf in documents.items()]
+        texts = [text for _, sections in document_sections for _, chunks in sections for text, _, _ in chunks]
+        if not texts:
+            return
+        if isinstance(self.embedder, TfidfEmbedder) and not self.embedder.is_fitted:
+            self.embedder.fit(texts)
+            self._matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        row = len(self._chunk_pages)
+        for doc_id, sections in document_sections:
+            for link_idx, chunks in sections:
+                self._section_keys.append((doc_id, link_idx))
+                self._section_starts.append(row)
+                self._chunk_pages += [(start_page, end_page) for _, start_page, end_page in chunks]
+                row += len(chunks)
+        self._pending.append(self.embedder.embed(texts))
+
+    def add_document(self, doc_id: str, zpdf: ZPDF):
+        self.add_documents({doc_id: zpdf})
+
+    def remove_document(self, doc_id: str):
+        if not any(section_doc_id == doc_id for section_doc_id, _ in self._section_keys):
+            return
+        section_ends = self._section_starts[1:] + [len(self._chunk_pages)]
+        keep_rows = []
+        section_keys, section_starts = [], []
+        for section_key, start, end in zip(self._section_keys, self._section_starts, section_ends):
+            if section_key[0] == doc_id:
+                continue
+            section_keys.append(section_key)
+            section_starts.append(len(keep_rows))
+            keep_rows += range(start, end)
+        self._matrix = self._get_matrix()[keep_rows]
+        self._chunk_pages = [self._chunk_pages[row] for row in keep_rows]
+        self._section_keys = section_keys
+        self._section_starts = section_starts
+
+    def search_batch(self, queries: list[str], top_k: int = 10, doc_ids: list[str] | None = None) -> list[list[VectorHit]]:
+        ''' Best chunk score per section, one matrix product for the whole batch of queries '''
+        matrix = self._get_matrix()
+        if not self._section_keys or not queries:
+            return [[] for _ in queries]
+        chunk_scores = self.embedder.embed(queries) @ matrix.T
+        section_starts = np.array(self._section_starts)
+        section_scores = np.maximum.reduceat(chunk_scores, section_starts, axis=1)
+        if doc_ids is not None:
+            doc_ids = set(doc_ids)
+            section_scores[:, [section_doc_id not in doc_ids for section_doc_id, _ in self._section_keys]] = -np.inf
+        top_k = min(top_k, len(self._section_keys))
+        top_sections = np.argpartition(-section_scores, top_k - 1, axis=1)[:, :top_k]
+        section_ends = np.append(section_starts[1:], len(self._chunk_pages))
+        results = []
+        for query_scores, query_chunk_scores, sections in zip(section_scores, chunk_scores, top_sections):
+            hits = []
+            for section in sorted(sections, key=lambda x: -query_scores[x]):
+                # no shared features with the query
+                if query_scores[section] <= 0:
+                    continue
+                start, end = section_starts[section], section_ends[section]
+                start_page, end_page = self._chunk_pages[start + int(np.argmax(query_chunk_scores[start:end]))]
+                doc_id, link_idx = self._section_keys[section]
+                hits.append(VectorHit(doc_id=doc_id, link_idx=link_idx, start_page=start_page, end_page=end_page, score=float(query_scores[section])))
+            results.append(hits)
+        return results
+
+    def search(self, query: str, top_k: int = 10, doc_ids: list[str] | None = None) -> list[VectorHit]:
+        return self.search_batch([query], top_k, doc_ids)[0]
+
+    def save(self, directory: str):
+        ''' vectors.npy can be memory mapped on load, sections.json holds the row metadata and the embedder config '''
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'vectors.npy'), self._get_matrix())
+        with open(os.path.join(directory, 'sections.json'), 'w') as f:
+            f.write(json.dumps({
+                'embedder': self.embedder.get_config(),
+                'chunk_words': self.chunk_words,
+                'overlap': self.overlap,
+                'section_keys': self._section_keys,
+                'section_starts': self._section_starts,
+                'chunk_pages': self._chunk_pages,
+            }))
+
+    @classmethod
+    def load(cls, directory: str, embedder=None, mmap: bool = True) -> 'SectionVectorIndex':
+        ''' embedder is only needed for embedders that are not built in '''
+        with open(os.path.join(directory, 'sections.json'), 'r') as f:
+            data = json.loads(f.read())
+        if embedder is None:
+            embedder = EMBEDDERS[data['embedder']['name']].from_config(data['embedder'])
+        index = cls(embedder, data['chunk_words'], data['overlap'])
+        index._matrix = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r' if mmap else None)
+        index._section_keys = [tuple(section_key) for section_key in data['section_keys']]
+        index._section_starts = data['section_starts']
+        index._chunk_pages = [tuple(chunk_page) for chunk_page in data['chunk_pages']]
+        return index
@@ -0,0 +1,214 @@
+import re
+import math
+import json
+import zlib
+from collections import Counter
+from pydantic import BaseModel
+from zpdf import ZPDF, TocTreeNode
+
+_token_pattern = re.compile(r'[a-z0-9]+')
+_phrase_pattern = re.compile(r'"([^"]*)"')
+
+
+def tokenize(text: str) -> list[str]:
+    return _token_pattern.findall(text.lower())
+
+
+def get_own_text_node(node: TocTreeNode) -> TocTreeNode:
+    ''' Section limited to its own text, up to its first child '''
+    if not node.children:
+        return node
+    first_child = node.children[0]
+    return TocTreeNode(link_idx=node.link_idx, link_label=node.link_label, start_page=node.start_page, end_page=first_child.start_page, end_tag=first_child.link_idx)
+
+
+class SearchHit(BaseModel):
+    doc_id: str
+    link_idx: str
+    score: float
+
+
+class SectionSearchIndex:
+    ''' Offline positional inverted index over TOC sections with BM25 ranking and phrase queries
+
+    every section is indexed with its label and its own text (up to its first child), so parents do not repeat their children text
+    '''
+    VERSION = 1
+
+    k1: float
+    b: float
+    _sections: list[tuple[str, str] | None]
+    _section_lengths: list[int]
+    _section_tokens: list[list[str]]
+    _section_ids: dict[tuple[str, str], int]
+    _doc_versions: dict[str, str | None]
+    _postings: dict[str, dict[int, list[int]]]
+    _total_length: int
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._sections = []
+        self._section_lengths = []
+        self._section_tokens = []
+        self._section_ids = {}
+        self._doc_versions = {}
+        self._postings = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._section_ids)
+
+    def add_section(self, doc_id: str, link_idx: str, text: str):
+        self.remove_section(doc_id, link_idx)
+        tokens = tokenize(text)
+        section_id = len(self._sections)
+        self._sections.append((doc_id, link_idx))
+        self._section_lengths.append(len(tokens))
+        # distinct tokens, so removing the section only touches its own postings
+        self._section_tokens.append(list(dict.fromkeys(tokens)))
+        self._section_ids[(doc_id, link_idx)] = section_id
+        self._total_length += len(tokens)
+        for position, token in enumerate(tokens):
+            self._postings.setdefault(token, {}).setdefault(section_id, []).append(position)
+
+    def _remove_section_ids(self, section_ids: set[int]):
+        for section_id in section_ids:
+            del self._section_ids[self._sections[section_id]]
+            self._sections[section_id] = None
+            self._total_length -= self._section_lengths[section_id]
+            self._section_lengths[section_id] = 0
+            for token in self._section_tokens[section_id]:
+                postings = self._postings[token]
+                del postings[section_id]
+                if not postings:
+                    del self._postings[token]
+            self._section_tokens[section_id] = []
+
+    def remove_section(self, doc_id: str, link_idx: str):
+        section_id = self._section_ids.get((doc_id, link_idx))
+        if section_id is not None:
+            self._remove_section_ids({section_id})
+
+    def add_document(self, doc_id: str, zpdf: ZPDF, version: str | None = None, toc_keys: list[str] | None = None) -> bool:
+        ''' Index (or reindex) a document, skipped if it was already indexed with the same version (e.g. its cache key)
+
+        toc_keys restricts reindexing to these sections, for incremental updates
+        '''
+        if version is not None and toc_keys is None and self._doc_versions.get(doc_id) == version:
+            return False
+        if toc_keys is None:
+            self.remove_document(doc_id)
+            stack = list(zpdf.get_toc_tree())
+        else:
+            stack = []
+            for toc_key, node in zip(toc_keys, zpdf.find_toc_tree_nodes(toc_keys)):
+                if node:
+                    stack.append(node)
+                else:
+                    self.remove_section(doc_id, toc_key)
+        while stack:
+            node = stack.pop()
+            if toc_keys is None:
+                stack += node.children
+            text = zpdf.get_toc_node_text(get_own_text_node(node)) or ''
+            self.add_section(doc_id, node.link_idx, f"{node.link_label}\n{text}")
+        self._doc_versions[doc_id] = version
+        return True
+
+    def remove_document(self, doc_id: str):
+        self._remove_section_ids({section_id for (section_doc_id, _), section_id in self._section_ids.items() if section_doc_id == doc_id})
+        self._doc_versions.pop(doc_id, None)
+
+    def _has_phrase(self, section_id: int, phrase_tokens: list[str]) -> bool:
+        positions = [set(self._postings[token][section_id]) for token in phrase_tokens]
+        return any(all(start + offset in positions[offset] for offset in range(1, len(positions))) for start in positions[0])
+
+    def search(self, query: str, top_k: int = 10, doc_ids: list[str] | None = None) -> list[SearchHit]:
+        ''' BM25 ranked sections, quoted parts of the query are phrases that must appear in the section '''
+        phrases = [tokenize(phrase) for phrase in _phrase_pattern.findall(query)]
+        phrases = [phrase for phrase in phrases if phrase]
+        terms = tokenize(_phrase_pattern.sub(' ', query)) + [token for phrase in phrases for token in phrase]
+        if not terms or not self._section_ids:
+            return []
+
+        # candidates must contain every phrase
+        candidates = None
+        for phrase in phrases:
+            if any(token not in self._postings for token in phrase):
+                return []
+            phrase_candidates = set.intersection(*[set(self._postings[token]) for token in phrase])
+            phrase_candidates = {x for x in phrase_candidates if self._has_phrase(x, phrase)}
+            candidates = phrase_candidates if candidates is None else candidates & phrase_candidates
+        if doc_ids is not None:
+            doc_ids = set(doc_ids)
+
+        section_count = len(self._section_ids)
+        avg_length = self._total_length / section_count or 1
+        scores: Counter[int] = Counter()
+        for term, term_count in Counter(terms).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (section_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for section_id, positions in postings.items():
+                if candidates is not None and section_id not in candidates:
+                    continue
+                if doc_ids is not None and self._sections[section_id][0] not in doc_ids:
+                    continue
+                tf = len(positions)
+                norm = self.k1 * (1 - self.b + self.b * self._section_lengths[section_id] / avg_length)
+                scores[section_id] += term_count * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return [
+            SearchHit(doc_id=self._sections[section_id][0], link_idx=self._sections[section_id][1], score=score)
+            for section_id, score in scores.most_common(top_k)
+        ]
+
+    def to_bytes(self) -> bytes:
+        ''' zlib compressed json, removed sections are compacted away '''
+        live_ids = sorted(self._section_ids.values())
+        new_ids = {section_id: new_id for new_id, section_id in enumerate(live_ids)}
+        data = {
+            'version': SectionSearchIndex.VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'sections': [list(self._sections[section_id]) + [self._section_lengths[section_id]] for section_id in live_ids],
+            'doc_versions': self._doc_versions,
+            'postings': {token: {new_ids[section_id]: positions for section_id, positions in postings.items()} for token, postings in self._postings.items()},
+        }
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+
+    def save(self, path: str):
+        ''' See zpdf_store.ZPDFCache.save_search_index to keep the index next to the TOC caches '''
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, buffer: bytes) -> 'SectionSearchIndex | None':
+        ''' Returns None if the buffer is corrupt or was written by another index version '''
+        try:
+            data = json.loads(zlib.decompress(buffer))
+        except (zlib.error, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != SectionSearchIndex.VERSION:
+            return None
+        index = cls(data['k1'], data['b'])
+        for section_id, (doc_id, link_idx, section_length) in enumerate(data['sections']):
+            index._sections.append((doc_id, link_idx))
+            index._section_lengths.append(section_length)
+            index._section_tokens.append([])
+            index._section_ids[(doc_id, link_idx)] = section_id
+            index._total_length += section_length
+        index._doc_versions = data['doc_versions']
+        index._postings = {token: {int(section_id): positions for section_id, positions in postings.items()} for token, postings in data['postings'].items()}
+        for token, postings in index._postings.items():
+            for section_id in postings:
+                index._section_tokens[section_id].append(token)
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> 'SectionSearchIndex | None':
+        ''' Returns None if the file is corrupt or was written by another index version '''
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
@@ -0,0 +1,216 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+from zpdf import CompactTocTree, PageTextStore, compute_cache_key, DEFAULT_SHORT_LINK_THRESHOLD, DEFAULT_ALLOWED_HEADER_CHARS
+from zpdf_search import SectionSearchIndex
+
+try:
+    import fcntl
+except ImportError:  # no file locks on this platform, the store is then only safe for a single process
+    fcntl = None
+
+
+class ZPDFCache:
+    ''' Directory store for compact TOC caches, page text stores and search indexes with atomic writes, file locks and size bounded eviction '''
+    CACHE_EXT = '.ztoc'
+    TEXT_EXT = '.ztxt'
+    INDEX_EXT = '.zidx'
+    MANIFEST_FILE = 'manifest.json'
+    LOCK_DIR = 'locks'
+
+    cache_dir: str
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, cache_dir: str, max_bytes: int = 0):
+        ''' max_bytes = 0 disables eviction '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(cache_dir, ZPDFCache.LOCK_DIR), exist_ok=True)
+
+    @contextmanager
+    def _file_lock(self, lock_name: str, remove: bool = False):
+        ''' remove unlinks the lock file on release, waiters that locked the unlinked file retry on a new one '''
+        if fcntl is None:
+            yield
+            return
+        lock_path = os.path.join(self.cache_dir, ZPDFCache.LOCK_DIR, lock_name)
+        while True:
+            lock_file = open(lock_path, 'a')
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                lock_stat = os.stat(lock_path)
+            except FileNotFoundError:
+                lock_stat = None
+            file_stat = os.fstat(lock_file.fileno())
+            if lock_stat is not None and (lock_stat.st_dev, lock_stat.st_ino) == (file_stat.st_dev, file_stat.st_ino):
+                break
+            lock_file.close()
+        try:
+            yield
+        finally:
+            # unlinked while still held, so no other process can lock this file afterwards
+            if remove:
+                os.unlink(lock_path)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _store_lock(self):
+        return self._file_lock('store.lock')
+
+    def entry_lock(self, cache_key: str):
+        ''' Exclusive lock for a single cache entry, used to parse a document in one process only
+
+        the lock file only exists while the lock is held or waited on, so the lock directory does not grow with the store
+        '''
+        return self._file_lock(f"{cache_key}.lock", remove=True)
+
+    def _atomic_write(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _entry_path(self, cache_key: str) -> str:
+        return os.path.join(self.cache_dir, cache_key + ZPDFCache.CACHE_EXT)
+
+    def _text_entry_path(self, cache_key: str) -> str:
+        return os.path.join(self.cache_dir, cache_key + ZPDFCache.TEXT_EXT)
+
+    def _index_path(self, name: str) -> str:
+        # keyed by index version, indexes of other versions are never read
+        return os.path.join(self.cache_dir, f"{name}.v{SectionSearchIndex.VERSION}{ZPDFCache.INDEX_EXT}")
+
+    def _read_manifest(self) -> dict[str, dict]:
+        try:
+            with open(os.path.join(self.cache_dir, ZPDFCache.MANIFEST_FILE), 'r') as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get_cache_key(self, file_path: str, short_link_threshold: int = DEFAULT_SHORT_LINK_THRESHOLD, allowed_header_chars: str = DEFAULT_ALLOWED_HEADER_CHARS) -> str:
+        ''' Cache key of a PDF, only rehashed when the file mtime or size changed, stale entries of the file are dropped '''
+        file_path = os.path.abspath(file_path)
+        file_stat = os.stat(file_path)
+        settings = [short_link_threshold, allowed_header_chars]
+        manifest_entry = self._read_manifest().get(file_path)
+        if manifest_entry and manifest_entry['mtime_ns'] == file_stat.st_mtime_ns and manifest_entry['size'] == file_stat.st_size and manifest_entry['settings'] == settings:
+            return manifest_entry['cache_key']
+
+        cache_key = compute_cache_key(file_path, short_link_threshold, allowed_header_chars)
+        with self._store_lock():
+            manifest = self._read_manifest()
+            stale_entry = manifest.get(file_path)
+            manifest[file_path] = {'mtime_ns': file_stat.st_mtime_ns, 'size': file_stat.st_size, 'settings': settings, 'cache_key': cache_key}
+            if stale_entry and stale_entry['cache_key'] != cache_key and all(x['cache_key'] != stale_entry['cache_key'] for x in manifest.values()):
+                self._remove_entry(stale_entry['cache_key'])
+            self._atomic_write(os.path.join(self.cache_dir, ZPDFCache.MANIFEST_FILE), json.dumps(manifest, indent=2).encode())
+        return cache_key
+
+    def load(self, cache_key: str) -> CompactTocTree | None:
+        entry_path = self._entry_path(cache_key)
+        try:
+            compact_cache = CompactTocTree.load(entry_path, cache_key=cache_key)
+        except FileNotFoundError:
+            compact_cache = None
+        if compact_cache is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(entry_path)  # mtime tracks last use for eviction
+        except FileNotFoundError:
+            pass
+        return compact_cache
+
+    def save(self, compact_cache: CompactTocTree):
+        with self._store_lock():
+            self._atomic_write(self._entry_path(compact_cache.cache_key), compact_cache.to_bytes())
+            self._evict()
+
+    def load_text(self, cache_key: str) -> PageTextStore | None:
+        ''' Page text stored next to the TOC cache of cache_key, not counted in hits and misses '''
+        text_entry_path = self._text_entry_path(cache_key)
+        try:
+            text_store = PageTextStore.load(text_entry_path, cache_key=cache_key)
+        except FileNotFoundError:
+            return None
+        if text_store is not None:
+            try:
+                os.utime(text_entry_path)
+            except FileNotFoundError:
+                pass
+        return text_store
+
+    def save_text(self, text_store: PageTextStore):
+        with self._store_lock():
+            self._atomic_write(self._text_entry_path(text_store.cache_key), text_store.to_bytes())
+            self._evict()
+
+    def load_search_index(self, name: str = 'search') -> SectionSearchIndex | None:
+        ''' Returns None if the store holds no valid index of this name for the current index version, indexes are never evicted '''
+        try:
+            with open(self._index_path(name), 'rb') as f:
+                return SectionSearchIndex.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
+
+    def save_search_index(self, index: SectionSearchIndex, name: str = 'search'):
+        with self._store_lock():
+            self._atomic_write(self._index_path(name), index.to_bytes())
+
+    def _remove_entry(self, cache_key: str):
+        for entry_path in (self._entry_path(cache_key), self._text_entry_path(cache_key)):
+            try:
+                os.unlink(entry_path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        ''' Remove least recently used entries until the store fits in max_bytes, caller holds the store lock '''
+        if not self.max_bytes:
+            return
+        # the TOC cache and the page text of a key are evicted together
+        entries: dict[str, tuple[int, int]] = {}
+        for file_name in os.listdir(self.cache_dir):
+            cache_key, ext = os.path.splitext(file_name)
+            if ext not in (ZPDFCache.CACHE_EXT, ZPDFCache.TEXT_EXT):
+                continue
+            try:
+                entry_stat = os.stat(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                continue
+            mtime_ns, entry_size = entries.get(cache_key, (0, 0))
+            entries[cache_key] = (max(mtime_ns, entry_stat.st_mtime_ns), entry_size + entry_stat.st_size)
+        total_bytes = sum(entry_size for _, entry_size in entries.values())
+        for cache_key, (_, entry_size) in sorted(entries.items(), key=lambda x: x[1]):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove_entry(cache_key)
+            total_bytes -= entry_size
+            self.evictions += 1
+
+    def clear(self):
+        with self._store_lock():
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith((ZPDFCache.CACHE_EXT, ZPDFCache.TEXT_EXT, ZPDFCache.INDEX_EXT)) or file_name == ZPDFCache.MANIFEST_FILE:
+                    os.unlink(os.path.join(self.cache_dir, file_name))
+
+    def get_stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }